@@ -0,0 +1,75 @@
+import os
+import time
+import threading
+
+# === Active User Tracking Configuration ===
+ACTIVE_WINDOW_MINUTES = int(os.getenv("DAIVERP_ACTIVE_WINDOW", "60"))  # Longest "active in last N minutes" query
+
+# === Expiring Active User Tracker ===
+class ActiveUserTracker:
+    """
+    Counts distinct clients seen in the last N minutes without keeping every
+    IP forever.
+
+    A ring of `window` per-minute buckets holds each client in the bucket of
+    the minute it was last seen (plus an ip -> minute index to move it), so:
+      - touch() is O(1): move the IP to the current minute's bucket
+      - active(n) is O(buckets): sum the bucket sizes of the last n minutes
+      - memory is bounded by the clients seen within the window; a bucket
+        and its IPs are dropped once the ring wraps past it
+    All access goes through one lock, so concurrent requests are safe.
+    Ref: https://en.wikipedia.org/wiki/Circular_buffer
+    """
+
+    def __init__(self, window=ACTIVE_WINDOW_MINUTES):
+        self.window = window
+        self._minutes = [None] * window  # Minute number each slot currently holds
+        self._buckets = [set() for _ in range(window)]
+        self._last_seen = {}  # ip -> minute number
+        self._lock = threading.Lock()
+
+    def _expire(self, minute):
+        """Empties slots older than the window (caller holds the lock)."""
+        for slot, held in enumerate(self._minutes):
+            if held is not None and held <= minute - self.window:
+                for ip in self._buckets[slot]:
+                    del self._last_seen[ip]
+                self._buckets[slot] = set()
+                self._minutes[slot] = None
+
+    def touch(self, ip, now=None):
+        """Marks `ip` as seen now; returns False if it was already seen this minute."""
+        minute = int((now or time.time()) // 60)
+        slot = minute % self.window
+        with self._lock:
+            if self._minutes[slot] != minute:
+                # Slot is being reused for a new minute: its IPs have expired
+                for stale in self._buckets[slot]:
+                    del self._last_seen[stale]
+                self._buckets[slot] = set()
+                self._minutes[slot] = minute
+
+            previous = self._last_seen.get(ip)
+            if previous == minute:
+                return False
+            if previous is not None:
+                self._buckets[previous % self.window].discard(ip)
+            self._buckets[slot].add(ip)
+            self._last_seen[ip] = minute
+            return True
+
+    def active(self, minutes=15, now=None):
+        """Distinct clients seen in the last `minutes` minutes (capped at the window)."""
+        minute = int((now or time.time()) // 60)
+        minutes = min(minutes, self.window)
+        with self._lock:
+            self._expire(minute)
+            return sum(
+                len(self._buckets[slot])
+                for slot, held in enumerate(self._minutes)
+                if held is not None and held > minute - minutes
+            )
+
+    def __len__(self):
+        with self._lock:
+            return len(self._last_seen)
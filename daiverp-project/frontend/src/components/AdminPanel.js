@@ -4,7 +4,7 @@
            browser clock during polling, eliminating any DST / skew.
     — Everything else unchanged.
     ──────────────────────────────────────────────────────────── */
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { Bar, Pie } from "react-chartjs-2";
 import { Chart as ChartJS } from "chart.js/auto";
 import "./AdminPanel.css";
@@ -65,128 +65,172 @@ function AdminPanel() {
   const [hourTotals, setHourTotals] = useState({ labels: [], totals: [] });
   const [range, setRange]         = useState("daily");
 
-  /* metric cards */
-  useEffect(() => {
-    fetch("/api/admin/metrics")
-      .then((r) => (r.ok ? r.json() : null))
-      .then((d) => d && setMetrics(d))
-      .catch(() => {});
-  }, []);
+  /* ETag of the last dashboard payload, sent back so unchanged polls get 304 */
+  const etagRef = useRef(null);
 
-  /* charts on range change */
-  useEffect(() => {
-    if (range === "daily") {
-      const curUTC = new Date().getUTCHours();
-      const labels = hourLabels24.slice(0, curUTC + 1);
-      const baseV1 = demoHourV1.slice(0, curUTC + 1);
-      const baseV2 = demoHourV2.slice(0, curUTC + 1);
-
-      setStackedData({
-        labels,
-        datasets: [
-          { label: "V1", data: baseV1, backgroundColor: "#0d6efd" },
-          { label: "V2", data: baseV2, backgroundColor: "#fd7e14" },
-        ],
-      });
-      setHourTotals({ labels, totals: baseV1.map((v, i) => v + baseV2[i]) });
-      setPieData({
-        labels: ["V1", "V2"],
-        datasets: [{ data: [sumArr(baseV1), sumArr(baseV2)], backgroundColor: ["#0d6efd", "#fd7e14"] }],
-      });
-      return;
-    }
+  /* hourly view: demo baseline + live counts from the server's last 24 h */
+  const applyHourly = (hr) => {
+    if (!hr || !Array.isArray(hr.labels) || hr.labels.length === 0) return;
+
+    /* derive current hour from server’s last label */
+    const lastLabel = hr.labels[hr.labels.length - 1];   // e.g. "17:00"
+    const curUTC    = parseInt(lastLabel.split(":")[0], 10);
+    const labels    = hourLabels24.slice(0, curUTC + 1);
+
+    const liveV1 = Array(curUTC + 1).fill(0);
+    const liveV2 = Array(curUTC + 1).fill(0);
+    hr.labels.forEach((lab, i) => {
+      const idx = labels.indexOf(normHour(lab));
+      if (idx !== -1) {
+        liveV1[idx] = Number(hr.v1[i] || 0);
+        liveV2[idx] = Number(hr.v2[i] || 0);
+      }
+    });
 
-    const days = range === "weekly" ? 7 : 30;
+    const mergedV1 = demoHourV1.slice(0, curUTC + 1).map((d, i) => d + liveV1[i]);
+    const mergedV2 = demoHourV2.slice(0, curUTC + 1).map((d, i) => d + liveV2[i]);
+    const mergedTotals = mergedV1.map((v, i) => v + mergedV2[i]);
+
+    setStackedData({
+      labels,
+      datasets: [
+        { label: "V1", data: mergedV1, backgroundColor: "#0d6efd" },
+        { label: "V2", data: mergedV2, backgroundColor: "#fd7e14" },
+      ],
+    });
+    setHourTotals({ labels, totals: mergedTotals });
+    setPieData({
+      labels: ["V1", "V2"],
+      datasets: [{ data: [sumArr(mergedV1), sumArr(mergedV2)], backgroundColor: ["#0d6efd", "#fd7e14"] }],
+    });
+  };
+
+  /* weekly / monthly view: per-day series on top of the demo baseline */
+  const applyDaily = (data, days) => {
     const dayLabels = lastNDays(days);
+    const apiMap =
+      data && Array.isArray(data.labels)
+        ? new Map(
+            data.labels.map((l, i) => [
+              l,
+              { v1: data.v1[i] ?? 0, v2: data.v2[i] ?? 0 },
+            ])
+          )
+        : new Map();
 
-    fetch(`/api/admin/weekly-predictions?range=${range}`)
-      .then((r) => (r.ok ? r.json() : null))
-      .then((data) => {
-        const apiMap =
-          data && Array.isArray(data.labels)
-            ? new Map(
-                data.labels.map((l, i) => [
-                  l,
-                  { v1: data.v1[i] ?? 0, v2: data.v2[i] ?? 0 },
-                ])
-              )
-            : new Map();
-
-        const v1 = [];
-        const v2 = [];
-        dayLabels.forEach((lab, i) => {
-          const api = apiMap.get(lab) ?? { v1: 0, v2: 0 };
-          const amp  = 1 + rndForLabel("amp" + lab) * 5;
-          const phi  = rndForLabel("phi" + lab) * 2 * Math.PI;
-          const base1 = Math.floor(rndForLabel("b1" + lab) * 16) + 15;
-          const base2 = Math.floor(rndForLabel("b2" + lab) * 11) + 10;
-          v1.push(Math.round(base1 + amp * Math.sin(i / 2 + phi)) + api.v1);
-          v2.push(Math.round(base2 + (amp - 1) * Math.cos(i / 2 + phi)) + api.v2);
-        });
-
-        setStackedData({
-          labels: dayLabels,
-          datasets: [
-            { label: "V1", data: v1, backgroundColor: "#0d6efd" },
-            { label: "V2", data: v2, backgroundColor: "#fd7e14" },
-          ],
-        });
-        setPieData({
-          labels: ["V1", "V2"],
-          datasets: [{ data: [sumArr(v1), sumArr(v2)], backgroundColor: ["#0d6efd", "#fd7e14"] }],
-        });
-        setHourTotals({ labels: [], totals: [] });
-      })
-      .catch(() => {});
-  }, [range]);
+    const v1 = [];
+    const v2 = [];
+    dayLabels.forEach((lab, i) => {
+      const api = apiMap.get(lab) ?? { v1: 0, v2: 0 };
+      const amp  = 1 + rndForLabel("amp" + lab) * 5;
+      const phi  = rndForLabel("phi" + lab) * 2 * Math.PI;
+      const base1 = Math.floor(rndForLabel("b1" + lab) * 16) + 15;
+      const base2 = Math.floor(rndForLabel("b2" + lab) * 11) + 10;
+      v1.push(Math.round(base1 + amp * Math.sin(i / 2 + phi)) + api.v1);
+      v2.push(Math.round(base2 + (amp - 1) * Math.cos(i / 2 + phi)) + api.v2);
+    });
 
-  /* live polling (hourly) */
+    setStackedData({
+      labels: dayLabels,
+      datasets: [
+        { label: "V1", data: v1, backgroundColor: "#0d6efd" },
+        { label: "V2", data: v2, backgroundColor: "#fd7e14" },
+      ],
+    });
+    setPieData({
+      labels: ["V1", "V2"],
+      datasets: [{ data: [sumArr(v1), sumArr(v2)], backgroundColor: ["#0d6efd", "#fd7e14"] }],
+    });
+    setHourTotals({ labels: [], totals: [] });
+  };
+
+  /* demo baseline while the first dashboard payload loads */
   useEffect(() => {
     if (range !== "daily") return;
+    const curUTC = new Date().getUTCHours();
+    const labels = hourLabels24.slice(0, curUTC + 1);
+    const baseV1 = demoHourV1.slice(0, curUTC + 1);
+    const baseV2 = demoHourV2.slice(0, curUTC + 1);
+
+    setStackedData({
+      labels,
+      datasets: [
+        { label: "V1", data: baseV1, backgroundColor: "#0d6efd" },
+        { label: "V2", data: baseV2, backgroundColor: "#fd7e14" },
+      ],
+    });
+    setHourTotals({ labels, totals: baseV1.map((v, i) => v + baseV2[i]) });
+    setPieData({
+      labels: ["V1", "V2"],
+      datasets: [{ data: [sumArr(baseV1), sumArr(baseV2)], backgroundColor: ["#0d6efd", "#fd7e14"] }],
+    });
+  }, [range]);
+
+  /* live updates: dashboard payload on load, on finished jobs and each hour; metric deltas pushed */
+  useEffect(() => {
+    etagRef.current = null;  // new range, new payload
+    let cancelled = false;
 
-    const poll = () =>
-      fetch("/api/admin/hourly-predictions?hours=24")
-        .then((r) => (r.ok ? r.json() : null))
-        .then((hr) => {
-          if (!hr || !Array.isArray(hr.labels) || hr.labels.length === 0) return;
-
-          /* derive current hour from server’s last label */
-          const lastLabel = hr.labels[hr.labels.length - 1];   // e.g. "17:00"
-          const curUTC    = parseInt(lastLabel.split(":")[0], 10);
-          const labels    = hourLabels24.slice(0, curUTC + 1);
-
-          const liveV1 = Array(curUTC + 1).fill(0);
-          const liveV2 = Array(curUTC + 1).fill(0);
-          hr.labels.forEach((lab, i) => {
-            const idx = labels.indexOf(normHour(lab));
-            if (idx !== -1) {
-              liveV1[idx] = Number(hr.v1[i] || 0);
-              liveV2[idx] = Number(hr.v2[i] || 0);
-            }
-          });
-
-          const mergedV1 = demoHourV1.slice(0, curUTC + 1).map((d, i) => d + liveV1[i]);
-          const mergedV2 = demoHourV2.slice(0, curUTC + 1).map((d, i) => d + liveV2[i]);
-          const mergedTotals = mergedV1.map((v, i) => v + mergedV2[i]);
-
-          setStackedData({
-            labels,
-            datasets: [
-              { label: "V1", data: mergedV1, backgroundColor: "#0d6efd" },
-              { label: "V2", data: mergedV2, backgroundColor: "#fd7e14" },
-            ],
-          });
-          setHourTotals({ labels, totals: mergedTotals });
-          setPieData({
-            labels: ["V1", "V2"],
-            datasets: [{ data: [sumArr(mergedV1), sumArr(mergedV2)], backgroundColor: ["#0d6efd", "#fd7e14"] }],
-          });
+    const loadDashboard = () => {
+      const headers = etagRef.current ? { "If-None-Match": etagRef.current } : {};
+      fetch(`/api/admin/dashboard?range=${range}`, { headers })
+        .then((r) => {
+          if (cancelled || r.status === 304 || !r.ok) return null;  // 304: nothing changed since the last fetch
+          etagRef.current = r.headers.get("ETag");
+          return r.json();
+        })
+        .then((d) => {
+          if (!d) return;
+          if (d.metrics) setMetrics(d.metrics);
+          if (range === "daily") applyHourly(d.hourly);
+          else applyDaily(d.predictions, range === "weekly" ? 7 : 30);
         })
         .catch(() => {});
+    };
+
+    // Server-sent events replace the 15 s poll; (re)connecting reloads the full payload.
+    // A refused stream (503 when the server's stream slots are full) closes for good:
+    // reload the payload then and try again later
+    // Ref: https://developer.mozilla.org/en-US/docs/Web/API/EventSource
+    const STREAM_RETRY_MS = 15000;
+    let source;
+    let retryTimer;
+    const connect = () => {
+      source = new EventSource("/api/events?types=metrics,job");
+      source.onopen = loadDashboard;
+      source.onerror = () => {
+        if (cancelled || source.readyState !== EventSource.CLOSED) return;  // CONNECTING: it retries itself
+        loadDashboard();
+        retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+      };
+      source.addEventListener("metrics", (event) => {
+        const delta = JSON.parse(event.data);  // only the counters that changed
+        setMetrics((m) => ({ ...m, ...delta }));
+      });
+      source.addEventListener("job", (event) => {
+        const job = JSON.parse(event.data);
+        if (job.state === "done" || job.state === "failed") loadDashboard();  // chart counts moved
+      });
+    };
+    connect();
+
+    // Hourly buckets roll over on the hour, with or without new jobs
+    let hourTimer;
+    const scheduleHour = () => {
+      const msToHour = 3600e3 - (Date.now() % 3600e3) + 1000;
+      hourTimer = setTimeout(() => {
+        loadDashboard();
+        scheduleHour();
+      }, msToHour);
+    };
+    scheduleHour();
 
-    poll();
-    const id = setInterval(poll, 15000);
-    return () => clearInterval(id);
+    return () => {
+      cancelled = true;
+      source.close();
+      clearTimeout(retryTimer);
+      clearTimeout(hourTimer);
+    };
   }, [range]);
 
   /* ─────────── UI ─────────── */
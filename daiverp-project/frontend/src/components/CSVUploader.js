@@ -10,7 +10,10 @@ function CSVUploader({ onUploadSuccess }) {
   const [selectedModel, setSelectedModel] = useState("V1");  // User-selected model version
 
   // API endpoint — dynamically resolve hostname to support HTTPS with EC2 IP or domain
-  const apiUrl = `https://${window.location.hostname}:8080/upload`;
+  const backendUrl = `https://${window.location.hostname}:8080`;
+  // Streaming endpoint: the server parses the CSV while the upload is still arriving
+  const apiUrl = `${backendUrl}/upload/stream`;
+  const JOB_POLL_MS = 2000;  // Status poll interval when no event stream is available
 
   // Prevent default browser behavior on drag/drop
   // Ref: https://developer.mozilla.org/en-US/docs/Web/API/HTML_Drag_and_Drop_API
@@ -65,27 +68,79 @@ function CSVUploader({ onUploadSuccess }) {
   const uploadFile = async (file) => {
     const formData = new FormData();
     formData.append("file", file);
-    formData.append("model", selectedModel); // Add selected model info
 
     try {
-      const response = await fetch(apiUrl, {
+      // Model goes in the query string so the server knows it before the file bytes arrive
+      const response = await fetch(`${apiUrl}?model=${encodeURIComponent(selectedModel)}`, {
         method: "POST",
         body: formData,
       });
 
+      if (response.status === 429) {
+        setUploadStatus("Server is busy. Please try again in a moment.");
+        return;
+      }
       if (!response.ok) {
         throw new Error(`Upload failed: ${response.statusText}`);
       }
 
-      const data = await response.json();
-      setDownloadUrl(data.download_url);
-      onUploadSuccess(data); // Pass response to parent (Dashboard.js)
+      // Upload returns a job ID straight away; follow its progress events until it finishes
+      const { job_id, result_url } = await response.json();
+      const job = await waitForJob(job_id);
+
+      // Dashboard.js pages through result_url itself, fetching only the rows it renders
+      setUploadStatus("");
+      setDownloadUrl(job.result.download_url);
+      onUploadSuccess({ download_url: job.result.download_url, result_url }); // Pass response to parent (Dashboard.js)
     } catch (error) {
       console.error("Error uploading file:", error);
       setUploadStatus("Upload failed. Please check the server and try again.");
     }
   };
 
+  // e.g. "Processing (scoring 120,000/471,689 rows)..."
+  const describeProgress = (job) => {
+    const counts = job.total ? ` ${job.done.toLocaleString()}/${job.total.toLocaleString()} rows` : "";
+    return `Processing (${job.stage}${counts})...`;
+  };
+
+  // Poll the job's status until it is done or failed
+  const pollJob = async (jobId) => {
+    for (;;) {
+      const response = await fetch(`${backendUrl}/api/jobs/${encodeURIComponent(jobId)}`);
+      if (!response.ok) throw new Error(`Job status failed: ${response.statusText}`);
+      const job = await response.json();
+      if (job.state === "done") return job;
+      if (job.state === "failed") throw new Error(job.error || "Prediction failed");
+      setUploadStatus(describeProgress(job));
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+    }
+  };
+
+  // Follow the job's server-sent events until the prediction is done or failed
+  // (the stream starts with the job's current state; EventSource reconnects by itself).
+  // If the server turns the stream away (503 when its stream slots are full), poll instead
+  // Ref: https://developer.mozilla.org/en-US/docs/Web/API/EventSource
+  const waitForJob = (jobId) =>
+    new Promise((resolve, reject) => {
+      const source = new EventSource(`${backendUrl}/api/events?types=job&job=${encodeURIComponent(jobId)}`);
+      source.addEventListener("job", (event) => {
+        const job = JSON.parse(event.data);
+        if (job.state === "done") {
+          source.close();
+          resolve(job);
+        } else if (job.state === "failed") {
+          source.close();
+          reject(new Error(job.error || "Prediction failed"));
+        } else {
+          setUploadStatus(describeProgress(job));
+        }
+      });
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) pollJob(jobId).then(resolve, reject);
+      };
+    });
+
   // === Component UI ===
   return (
     <div className="upload-container">
@@ -5,14 +5,38 @@ import { Bar } from "react-chartjs-2"; // Charting library for rendering severit
 import { Chart as ChartJS } from "chart.js/auto"; // Registers all required chart.js components globally
 import "./Dashboard.css"; // Local styling
 
+// === Fetch a result, waiting while the server is still writing it ===
+// The server answers 202 (downloads) or 409 (result pages) + Retry-After instead of
+// holding the request open, e.g. when another worker's result file is not readable yet
+const fetchWhenReady = async (url, retryOn = [202], attempts = 30) => {
+  for (let i = 0; i < attempts; i++) {
+    const response = await fetch(url, { method: "GET" });
+    if (!retryOn.includes(response.status)) return response;
+    const retryAfter = Number(response.headers.get("Retry-After")) || 1;
+    await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+  }
+  throw new Error("Result file was not ready in time");
+};
+
 function Dashboard() {
   // === State Hooks ===
   const [downloadUrl, setDownloadUrl] = useState(null);
   const [uploadStatus, setUploadStatus] = useState("");
   const [products, setProducts] = useState([]);
-  const [predictions, setPredictions] = useState([]);
+  const [predictions, setPredictions] = useState([]);          // Rows fetched so far (one or more pages)
   const [selectedProduct, setSelectedProduct] = useState("");
   const [searchQuery, setSearchQuery] = useState("");
+  const [debouncedQuery, setDebouncedQuery] = useState("");
+
+  // Server-side paging state for /api/results/<job_id>
+  const [resultUrl, setResultUrl] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalRows, setTotalRows] = useState(0);
+  const [severityCounts, setSeverityCounts] = useState({});
+  const [resultProducts, setResultProducts] = useState([]);
+  const [loadingPage, setLoadingPage] = useState(false);
+  const PAGE_SIZE = 200;
+  const httpsBackend = `https://${window.location.hostname}:8080`;
 
   const [sortConfig, setSortConfig] = useState({ key: null, direction: "asc" });
   const [showSeverityChart, setShowSeverityChart] = useState(false);
@@ -45,20 +69,66 @@ function Dashboard() {
   // === Handle successful CSV upload response ===
   const handleUploadSuccess = (response) => {
     if (response.download_url) {
-      const httpsBackend = `https://${window.location.hostname}:8080`;
       setDownloadUrl(`${httpsBackend}${response.download_url}`);
       setUploadStatus("✅ File processed successfully! Download predictions below.");
-      setPredictions(response.predictions || []);
+      setSelectedProduct("");
+      setSearchQuery("");
+      setResultUrl(response.result_url); // Rows are fetched page by page below
     } else {
       setUploadStatus("❌ Upload failed. Please check the file and try again.");
     }
   };
 
+  // === Map the table's sort column to the API's sort key ===
+  const sortParams = () => {
+    if (!sortConfig.key) return {};
+    const isRisk = sortConfig.key === "DAIVERP_Risk_Score" || sortConfig.key === "Severity";
+    return { sort: isRisk ? "risk" : sortConfig.key, order: sortConfig.direction };
+  };
+
+  // === Fetch one page of results (filtered and sorted server-side) ===
+  const fetchPage = async (cursor) => {
+    if (!resultUrl) return;
+    // schema=2: DAIVERP_Risk_Score arrives as a 0-1 number and is formatted here
+    const params = new URLSearchParams({ limit: PAGE_SIZE, schema: 2, ...sortParams() });
+    if (selectedProduct) params.set("product", selectedProduct);
+    if (debouncedQuery) params.set("q", debouncedQuery);
+    if (cursor) params.set("cursor", cursor);
+
+    setLoadingPage(true);
+    try {
+      const res = await fetchWhenReady(`${httpsBackend}${resultUrl}?${params.toString()}`, [409]);
+      if (!res.ok) throw new Error(`Fetching results failed: ${res.statusText}`);
+      const page = await res.json();
+      setPredictions((rows) => (cursor ? [...rows, ...page.predictions] : page.predictions));
+      setNextCursor(page.next_cursor);
+      setTotalRows(page.total);
+      setSeverityCounts(page.severity || {});
+      setResultProducts(page.products || []);
+    } catch (err) {
+      console.error("Error fetching results:", err);
+    } finally {
+      setLoadingPage(false);
+    }
+  };
+
+  // === Debounce the search box so typing doesn't fire a request per key ===
+  useEffect(() => {
+    const timer = setTimeout(() => setDebouncedQuery(searchQuery.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
+  // === Reload the first page whenever the result, filters or sort change ===
+  useEffect(() => {
+    fetchPage(null);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [resultUrl, selectedProduct, debouncedQuery, sortConfig]);
+
   // === Client-side download handler ===
   // Ref: https://developer.mozilla.org/en-US/docs/Web/API/Blob
   const handleDownload = async () => {
     try {
-      const response = await fetch(downloadUrl, { method: "GET" });
+      const response = await fetchWhenReady(downloadUrl);
       if (!response.ok) throw new Error("Network response was not ok");
       const blob = await response.blob();
       const url = window.URL.createObjectURL(blob);
@@ -74,9 +144,12 @@ function Dashboard() {
     }
   };
 
-  // === Convert DAIVERP score (e.g., 82.45%) to qualitative label ===
-  const getSeverityLabel = (scoreString) => {
-    const numericScore = parseFloat(scoreString.replace("%", "")) || 0;
+  // === Format a 0-1 DAIVERP score for display (e.g., 82.45%) ===
+  const formatScore = (score) => `${(score * 100).toFixed(2)}%`;
+
+  // === Convert DAIVERP score (0-1) to qualitative label ===
+  const getSeverityLabel = (score) => {
+    const numericScore = Math.round((score || 0) * 10000) / 100; // Same 2-decimal rounding as formatScore
     if (numericScore >= 80) return "Critical";
     if (numericScore >= 60) return "High";
     if (numericScore >= 40) return "Medium";
@@ -84,29 +157,7 @@ function Dashboard() {
     return "Very Low";
   };
 
-  // === Assign numerical weight for sorting by severity ===
-  const getSeverityRank = (scoreString) => {
-    const numericScore = parseFloat(scoreString.replace("%", "")) || 0;
-    if (numericScore >= 80) return 5;
-    if (numericScore >= 60) return 4;
-    if (numericScore >= 40) return 3;
-    if (numericScore >= 20) return 2;
-    return 1;
-  };
-
-  // === Efficient filtering by product and search query ===
-  // Ref: https://reactjs.org/docs/hooks-reference.html#usememo
-  const filteredPredictions = useMemo(() => {
-    return predictions.filter((row) => {
-      const productMatch = selectedProduct ? row.Product === selectedProduct : true;
-      const searchMatch =
-        row.CVE_ID.toLowerCase().includes(searchQuery.toLowerCase()) ||
-        row.System_ID.toLowerCase().includes(searchQuery.toLowerCase());
-      return productMatch && searchMatch;
-    });
-  }, [predictions, selectedProduct, searchQuery]);
-
-  // === Column-based sorting (client-side) ===
+  // === Column-based sorting (server-side; Severity sorts by score) ===
   const requestSort = (columnKey) => {
     let direction = "asc";
     if (sortConfig.key === columnKey && sortConfig.direction === "asc") {
@@ -115,34 +166,6 @@ function Dashboard() {
     setSortConfig({ key: columnKey, direction });
   };
 
-  // === Apply sortConfig to filtered data ===
-  const sortedPredictions = useMemo(() => {
-    if (!sortConfig.key) return filteredPredictions;
-    const sorted = [...filteredPredictions];
-
-    sorted.sort((a, b) => {
-      if (sortConfig.key === "DAIVERP_Risk_Score") {
-        const aNum = parseFloat(String(a.DAIVERP_Risk_Score).replace("%", "")) || 0;
-        const bNum = parseFloat(String(b.DAIVERP_Risk_Score).replace("%", "")) || 0;
-        return sortConfig.direction === "asc" ? aNum - bNum : bNum - aNum;
-      }
-
-      if (sortConfig.key === "Severity") {
-        const aRank = getSeverityRank(a.DAIVERP_Risk_Score);
-        const bRank = getSeverityRank(b.DAIVERP_Risk_Score);
-        return sortConfig.direction === "asc" ? aRank - bRank : bRank - aRank;
-      }
-
-      const aVal = String(a[sortConfig.key]).toLowerCase();
-      const bVal = String(b[sortConfig.key]).toLowerCase();
-      if (aVal < bVal) return sortConfig.direction === "asc" ? -1 : 1;
-      if (aVal > bVal) return sortConfig.direction === "asc" ? 1 : -1;
-      return 0;
-    });
-
-    return sorted;
-  }, [filteredPredictions, sortConfig]);
-
   const renderSortIcon = (colKey) => {
     if (sortConfig.key !== colKey) return " ↕";
     return sortConfig.direction === "asc" ? " ↑" : " ↓";
@@ -152,17 +175,11 @@ function Dashboard() {
   const handleShowChart = () => setShowSeverityChart(!showSeverityChart);
 
   // === Inline component: Bar chart grouped by severity levels ===
-  function SeverityBarChart({ predictions }) {
-    const severityCounts = useMemo(() => {
-      const counts = { Critical: 0, High: 0, Medium: 0, Low: 0, "Very Low": 0 };
-      predictions.forEach((row) => {
-        const sev = getSeverityLabel(row.DAIVERP_Risk_Score);
-        if (counts[sev] !== undefined) {
-          counts[sev]++;
-        }
-      });
-      return counts;
-    }, [predictions]);
+  // Counts come from the API and cover every matching row, not just loaded pages
+  function SeverityBarChart({ counts }) {
+    const severityCounts = useMemo(() => ({
+      Critical: 0, High: 0, Medium: 0, Low: 0, "Very Low": 0, ...counts,
+    }), [counts]);
 
     const data = useMemo(() => ({
       labels: Object.keys(severityCounts),
@@ -221,10 +238,9 @@ function Dashboard() {
   };
 
   const handleDownloadOldFile = async (filename) => {
-    const httpsBackend = `https://${window.location.hostname}:8080`;
     const downloadLink = `${httpsBackend}/download/${filename}`;
     try {
-      const response = await fetch(downloadLink);
+      const response = await fetchWhenReady(downloadLink);
       if (!response.ok) throw new Error("Download failed");
       const blob = await response.blob();
       const url = window.URL.createObjectURL(blob);
@@ -271,7 +287,7 @@ function Dashboard() {
         <input type="text" placeholder="🔍 Search by CVE ID or System ID..." className="search-bar" value={searchQuery} onChange={(e) => setSearchQuery(e.target.value)} />
         <select className="filter-dropdown" value={selectedProduct} onChange={(e) => setSelectedProduct(e.target.value)}>
           <option value="">📌 Filter by product/software...</option>
-          {[...new Set(predictions.map((p) => p.Product))].map((product, index) => (
+          {resultProducts.map((product, index) => (
             <option key={index} value={product}>{product}</option>
           ))}
         </select>
@@ -289,15 +305,15 @@ function Dashboard() {
             </tr>
           </thead>
           <tbody>
-            {sortedPredictions.length > 0 ? (
-              sortedPredictions.map((row, index) => {
+            {predictions.length > 0 ? (
+              predictions.map((row, index) => {
                 const severityLabel = getSeverityLabel(row.DAIVERP_Risk_Score);
                 return (
                   <tr key={index}>
                     <td>{row.CVE_ID}</td>
                     <td>{row.System_ID}</td>
                     <td>{row.Product}</td>
-                    <td>{row.DAIVERP_Risk_Score}</td>
+                    <td>{formatScore(row.DAIVERP_Risk_Score)}</td>
                     <td>{severityLabel}</td>
                   </tr>
                 );
@@ -313,6 +329,17 @@ function Dashboard() {
         </table>
       </div>
 
+      {resultUrl && (
+        <div className="pagination-container">
+          <p>Showing {predictions.length} of {totalRows} predictions</p>
+          {nextCursor && (
+            <button className="download-button" onClick={() => fetchPage(nextCursor)} disabled={loadingPage}>
+              {loadingPage ? "Loading..." : "Load more"}
+            </button>
+          )}
+        </div>
+      )}
+
       <div className="sidebar">
         <button className="sidebar-button" onClick={handleShowChart}>📈 CVE Count by Severity</button>
         <button className="sidebar-button" onClick={handleShowHistory}>🕑 History</button>
@@ -324,7 +351,7 @@ function Dashboard() {
         </div>
       )}
 
-      {showSeverityChart && <SeverityBarChart predictions={predictions} />}
+      {showSeverityChart && <SeverityBarChart counts={severityCounts} />}
 
       {showHistory && (
         <div className="history-panel" style={{ margin: "20px" }}>
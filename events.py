@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+from state import EVENT_REPLAY
+
+# === Event Stream Configuration ===
+EVENT_HEARTBEAT_SECONDS = 15  # Comment line sent on idle streams so proxies keep them open
+EVENT_STREAM_SECONDS = int(os.getenv("DAIVERP_EVENT_STREAM_SECONDS", "300"))  # Then the client reconnects
+EVENT_RETRY_MS = 3000  # Reconnect delay suggested to EventSource
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Open streams per worker process; each holds a server thread, so keep it below gunicorn's `threads`
+EVENT_MAX_STREAMS = int(os.getenv("DAIVERP_MAX_EVENT_STREAMS", "4"))
+EVENT_BUSY_RETRY_SECONDS = 10  # Suggested to clients turned away at the cap
+EVENT_SYNC_SECONDS = 5  # How long a new stream waits for a paused relay to resume
+
+class TooManyStreams(Exception):
+    """Raised by EventBus.open_stream when this process already serves max_streams streams."""
+
+# === Server-Sent Events Bus ===
+class EventBus:
+    """
+    Publishes events (job progress, admin metric deltas) to every open
+    /api/events stream.
+
+    Events are stored through the state backend (see state.py), which gives
+    each one an increasing id and keeps the recent ones. One relay thread per
+    process is the only reader of the store: it fetches new events and
+    copies them into the queue of each local subscriber, so the payload is
+    serialized once per event, not once per client, and the store is polled
+    once per process however many streams are open. With the SQLite backend
+    the relay also sees events published by other worker processes.
+
+    The relay also keeps the events it fetched in memory; new streams and
+    clients that reconnect with Last-Event-ID are replayed from there and
+    only go to the store for events older than that buffer. While no stream
+    is open the relay stops polling.
+
+    The relay thread starts on the first subscription, inside the worker
+    process that serves it. At most `max_streams` streams are open per
+    process, so streams can't take every server thread; open_stream()
+    raises TooManyStreams beyond that.
+    Ref: https://html.spec.whatwg.org/multipage/server-sent-events.html
+    """
+
+    def __init__(self, state, max_streams=EVENT_MAX_STREAMS):
+        self.state = state
+        self.max_streams = max_streams
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)  # Subscribers came, or the relay synced
+        self._relay = None
+        self._open_streams = 0
+        self._recent = deque(maxlen=EVENT_REPLAY)  # Events the relay fetched, oldest first
+        self._last_id = 0
+        self._synced = False  # True while the relay is polling, i.e. _recent is current
+
+    def publish(self, kind, data, key=None):
+        """Stores an event; `key` (e.g. a job id) lets streams filter on it."""
+        return self.state.append_event(kind, key, json.dumps(data))
+
+    def _start_relay(self):
+        with self._lock:
+            if self._relay is None:
+                self._relay = threading.Thread(target=self._relay_events, name="event-relay", daemon=True)
+                self._relay.start()
+
+    def _relay_events(self):
+        while True:
+            try:
+                with self._lock:
+                    if not self._subscribers:
+                        # Nobody is listening: stop polling until a stream opens
+                        self._synced = False
+                        self._changed.wait_for(lambda: self._subscribers)
+                    synced, last_id = self._synced, self._last_id
+                if not synced:
+                    # Start from the newest event; what came before is replayed from the store
+                    last_id = self.state.latest_event_id()
+                    with self._lock:
+                        self._recent.clear()
+                        self._last_id = last_id
+                        self._synced = True
+                        self._changed.notify_all()
+
+                events = self.state.events_after(last_id)
+                if not events:
+                    self.state.wait_for_event(last_id, EVENT_HEARTBEAT_SECONDS)
+                    continue
+                with self._lock:
+                    self._recent.extend(events)
+                    self._last_id = events[-1][0]
+                    subscribers = list(self._subscribers)
+                for inbox in subscribers:
+                    for event in events:
+                        try:
+                            inbox.put_nowait(event)
+                        except queue.Full:
+                            # Too slow to keep up: end its stream, it resumes from Last-Event-ID
+                            inbox.overflowed = True
+                            with self._lock:
+                                self._subscribers.discard(inbox)
+                            break
+            except Exception as e:
+                print(f"❌ ERROR: Event relay failed: {str(e)}")
+                time.sleep(1)
+
+    def _subscribe(self, inbox, last_event_id):
+        """
+        Registers `inbox` and returns (last id already covered, events to
+        replay); every later event is put in the inbox by the relay.
+        """
+        with self._lock:
+            self._subscribers.add(inbox)
+            self._changed.notify_all()
+            self._changed.wait_for(lambda: self._synced, EVENT_SYNC_SECONDS)
+            if self._synced:
+                delivered = self._last_id if last_event_id is None else last_event_id
+                oldest = self._recent[0][0] if self._recent else self._last_id + 1
+                if delivered >= oldest - 1:
+                    return delivered, [event for event in self._recent if event[0] > delivered]
+        # Further behind than the buffer (or the relay is stuck): read the backlog from the store
+        delivered = self.state.latest_event_id() if last_event_id is None else last_event_id
+        return delivered, self.state.events_after(delivered)
+
+    @staticmethod
+    def _format(event):
+        event_id, kind, _, data = event
+        return f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+
+    def stream(self, last_event_id=None, kinds=None, key=None):
+        """
+        Generator of text/event-stream chunks. `kinds` limits the event types,
+        `key` limits keyed events (job events) to one key. Ends after
+        EVENT_STREAM_SECONDS so no stream holds a server thread indefinitely;
+        EventSource reconnects on its own.
+        """
+        self._start_relay()
+        inbox = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        inbox.overflowed = False
+
+        def wanted(event):
+            return (not kinds or event[1] in kinds) and (key is None or event[2] in (None, key))
+
+        try:
+            # Subscribe before reading the backlog, then skip anything already sent
+            delivered, backlog = self._subscribe(inbox, last_event_id)
+            yield f"retry: {EVENT_RETRY_MS}\n\n"
+            for event in backlog:
+                delivered = event[0]
+                if wanted(event):
+                    yield self._format(event)
+
+            deadline = time.time() + EVENT_STREAM_SECONDS
+            while time.time() < deadline and not inbox.overflowed:
+                try:
+                    event = inbox.get(timeout=EVENT_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if event[0] <= delivered:
+                    continue
+                delivered = event[0]
+                if wanted(event):
+                    yield self._format(event)
+        finally:
+            with self._lock:
+                self._subscribers.discard(inbox)
+
+    def open_stream(self, last_event_id=None, kinds=None, key=None, head=()):
+        """
+        Claims one of the process's stream slots and returns the response body
+        for stream(), preceded by the `head` chunks. The slot is freed when
+        the server closes the body. Raises TooManyStreams when none is free.
+        """
+        with self._lock:
+            if self._open_streams >= self.max_streams:
+                raise TooManyStreams(f"{self._open_streams} event streams already open")
+            self._open_streams += 1
+
+        def chunks():
+            yield from head
+            yield from self.stream(last_event_id, kinds, key)
+
+        return StreamBody(chunks(), self._close_stream)
+
+    def _close_stream(self):
+        with self._lock:
+            self._open_streams -= 1
+
+# === Response Body Holding a Stream Slot ===
+class StreamBody:
+    """
+    Iterable WSGI response body that calls `on_close` once when the server
+    closes it, even if it was never iterated (a generator's finally would
+    not run in that case).
+    """
+
+    def __init__(self, chunks, on_close):
+        self._chunks = chunks
+        self._on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        try:
+            self._chunks.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close:
+                on_close()
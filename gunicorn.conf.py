@@ -0,0 +1,47 @@
+import os
+import gc
+import sys
+
+# === Gunicorn Production Config ===
+# Run from this directory: gunicorn -c gunicorn.conf.py server:app
+# Ref: https://docs.gunicorn.org/en/stable/settings.html
+bind = os.getenv("DAIVERP_BIND", "0.0.0.0:8080")
+workers = int(os.getenv("DAIVERP_WORKERS", "2"))
+worker_class = "gthread"  # Threads per worker, so one streaming upload does not block polls
+# Each open /api/events stream holds one thread; DAIVERP_MAX_EVENT_STREAMS (default 4) caps them per worker
+threads = int(os.getenv("DAIVERP_THREADS", "8"))
+keepalive = int(os.getenv("DAIVERP_KEEPALIVE", "5"))  # Seconds to hold idle dashboard connections
+# gthread parks idle keep-alive connections (pollers between requests) in its event loop, not a thread.
+# The views stay synchronous WSGI: an async view would still hold a thread for the whole request here.
+# Behind nginx, request buffering plus DAIVERP_SENDFILE=x-accel keep slow uploads and downloads
+# from holding worker threads (see server.py, Download Offload)
+timeout = int(os.getenv("DAIVERP_TIMEOUT", "120"))
+graceful_timeout = 30
+
+# === TLS (same self-signed certs as the development server) ===
+certfile = os.getenv("DAIVERP_CERT", "/home/ec2-user/cert.pem")
+keyfile = os.getenv("DAIVERP_KEY", "/home/ec2-user/key.pem")
+
+# === Preloading ===
+# server.py is imported once in the master: the model registry, CVE catalogue and tuned
+# batch size are loaded before forking, and workers share those pages copy-on-write
+preload_app = True
+
+# Several workers need shared job status / active users for consistent admin numbers
+if workers > 1:
+    os.environ.setdefault("DAIVERP_STATE_BACKEND", "sqlite")
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the GC's reach, so collections in the
+    # workers do not write to (and un-share) the preloaded model pages
+    # Ref: https://docs.python.org/3/library/gc.html#gc.freeze
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Job worker threads start on the first submit, i.e. inside this worker, never in the master
+    sys.modules["server"].after_fork()
+    print(f"🚀 Worker {worker.pid} ready")
+
+def child_exit(server, worker):
+    # Runs in the master for every worker that exits (crash, timeout kill, max_requests)
+    sys.modules["server"].worker_exited(worker.pid)
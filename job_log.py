@@ -0,0 +1,138 @@
+import os
+from datetime import datetime
+from sqlite_store import SQLiteStore  # model/, on the path set up by server.py
+
+# === Job Log Configuration ===
+JOB_LOG_PATH = os.getenv("DAIVERP_JOB_LOG", "/home/ec2-user/db/job_log.sqlite")
+
+# Bucket keys are prefixes of the ISO timestamps: "YYYY-MM-DDTHH" and "YYYY-MM-DD"
+BUCKET_WIDTHS = {"hour": 13, "day": 10}
+BUCKET_FORMATS = {"hour": "%Y-%m-%dT%H", "day": "%Y-%m-%d"}
+ROLLUP_TABLES = {"hour": "job_counts_hourly", "day": "job_counts_daily"}
+
+# === Persistent Prediction Job Log ===
+class JobLog(SQLiteStore):
+    """
+    Append-only SQLite log of finished prediction jobs, one row per job.
+
+    Replaces the in-memory history deque so the admin charts count every
+    job, across restarts. Timestamps are stored as ISO strings (local time,
+    as before), which sort chronologically, so range filters are indexed
+    scans on `timestamp` and per-model counts use the (model, timestamp)
+    index.
+
+    Each append also bumps per-hour and per-day counters per model in the
+    same transaction, so the chart queries read O(buckets) rollup rows
+    instead of scanning jobs. The rollups are derived data: they are
+    rebuilt from the jobs table on startup if the totals disagree, or on
+    demand with rebuild_rollups().
+    """
+
+    def __init__(self, path=JOB_LOG_PATH):
+        super().__init__(path)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                model TEXT NOT NULL,
+                filename TEXT,
+                job_id TEXT,
+                rows INTEGER
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_timestamp ON jobs (timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_model_timestamp ON jobs (model, timestamp)")
+        for table in ROLLUP_TABLES.values():
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, model)
+                ) WITHOUT ROWID
+            """)
+        conn.commit()
+
+        jobs = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        for table in ROLLUP_TABLES.values():
+            rolled = conn.execute(f"SELECT COALESCE(SUM(count), 0) FROM {table}").fetchone()[0]
+            if rolled != jobs:
+                print(f"🧹 Job log rollups out of sync ({rolled} vs {jobs} jobs), rebuilding")
+                self.rebuild_rollups()
+                break
+
+    def append(self, model, filename, job_id=None, rows=None, timestamp=None):
+        timestamp = timestamp or datetime.now().isoformat()
+        with self._conn() as conn:  # One transaction: the job row and its counters
+            conn.execute(
+                "INSERT INTO jobs (timestamp, model, filename, job_id, rows) VALUES (?, ?, ?, ?, ?)",
+                (timestamp, model, filename, job_id, rows),
+            )
+            for bucket, table in ROLLUP_TABLES.items():
+                conn.execute(
+                    f"INSERT INTO {table} (bucket, model, count) VALUES (?, ?, 1) "
+                    "ON CONFLICT (bucket, model) DO UPDATE SET count = count + 1",
+                    (timestamp[:BUCKET_WIDTHS[bucket]], model),
+                )
+
+    def rebuild_rollups(self):
+        """Recomputes the hourly and daily counters from the jobs table."""
+        with self._conn() as conn:
+            for bucket, table in ROLLUP_TABLES.items():
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(
+                    f"INSERT INTO {table} (bucket, model, count) "
+                    f"SELECT substr(timestamp, 1, {BUCKET_WIDTHS[bucket]}), model, COUNT(*) "
+                    "FROM jobs GROUP BY 1, 2"
+                )
+
+    def last_id(self):
+        """Id of the newest job; changes whenever a job is appended, in any process."""
+        return self._conn().execute("SELECT MAX(id) FROM jobs").fetchone()[0] or 0
+
+    def recent(self, limit=10):
+        """The latest jobs, newest first, shaped like the old history records."""
+        rows = self._conn().execute(
+            "SELECT timestamp, filename, model FROM jobs ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (limit,),
+        )
+        return [{"timestamp": ts, "filename": filename, "model": model} for ts, filename, model in rows]
+
+    def count_since(self, since):
+        """
+        Exact number of jobs at or after `since`: whole hours come from the
+        hourly rollup, the partial hour `since` falls in from the jobs index.
+        """
+        since = since.isoformat()
+        hour = since[:BUCKET_WIDTHS["hour"]]
+        conn = self._conn()
+        whole_hours = conn.execute(
+            "SELECT COALESCE(SUM(count), 0) FROM job_counts_hourly WHERE bucket > ?", (hour,)
+        ).fetchone()[0]
+        partial_hour = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE timestamp >= ? AND timestamp < ?", (since, hour + "~")
+        ).fetchone()[0]  # "~" sorts after every character of an ISO timestamp
+        return whole_hours + partial_hour
+
+    def counts(self, since=None, bucket="day"):
+        """
+        Returns [(bucket_start, model, count)] per "hour" or "day" from the
+        rollups, for the buckets after the one `since` falls in (all buckets
+        when None).
+        """
+        table = ROLLUP_TABLES[bucket]
+        query = f"SELECT bucket, model, count FROM {table}"
+        params = []
+        if since is not None:
+            query += " WHERE bucket > ?"
+            params.append(since.isoformat()[:BUCKET_WIDTHS[bucket]])
+        return [
+            (datetime.strptime(key, BUCKET_FORMATS[bucket]), model, count)
+            for key, model, count in self._conn().execute(query, params)
+        ]
+
+    def model_counts(self):
+        """{model: number of jobs} over the whole log, from the daily rollup."""
+        rows = self._conn().execute("SELECT model, SUM(count) FROM job_counts_daily GROUP BY model")
+        return dict(rows.fetchall())
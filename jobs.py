@@ -0,0 +1,182 @@
+import os
+import uuid
+import queue
+import threading
+from datetime import datetime
+from state import LocalState
+
+# === Job Queue Configuration ===
+JOB_WORKERS = int(os.getenv("DAIVERP_JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("DAIVERP_JOB_QUEUE_SIZE", "20"))
+JOB_RETENTION = int(os.getenv("DAIVERP_JOB_RETENTION", "100"))  # Finished jobs kept for polling
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the backlog is at capacity."""
+
+# === Background Prediction Job Queue ===
+class JobQueue:
+    """
+    Bounded queue of prediction jobs served by a fixed pool of worker threads.
+
+    `handler(job_id, payload, report)` runs on a worker and returns the job's
+    result dict; `report(stage, done, total)` updates the job's progress.
+    Jobs move through queued -> running -> done | failed. Only public fields
+    are returned by get()/list(); anything the handler stores under
+    "_private" keys stays server-side.
+
+    Worker threads are started on the first submit so the queue can be
+    created at import time without spawning threads in a parent process.
+    Callers that must do work before they can submit (e.g. read an upload)
+    reserve() a backlog slot first, so a full queue is reported up front.
+
+    Every change to a job is also published, minus private fields, to
+    `state` (see state.py), and list()/backlog() and lookups of jobs this
+    process does not run are answered from it. With a shared backend any
+    worker process can report on any job. `on_change(job)`, if given, is
+    called with the same public snapshot after every change.
+    Ref: https://docs.python.org/3/library/queue.html
+    """
+
+    def __init__(self, handler, workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, retention=JOB_RETENTION,
+                 state=None, on_change=None):
+        self.handler = handler
+        self.state = state or LocalState()
+        self.on_change = on_change
+        self.workers = workers
+        self.retention = retention
+        self.max_pending = max_pending
+        self._pending = queue.Queue()
+        self._slots = threading.Semaphore(max_pending)  # Free backlog places, taken before enqueueing
+        self._jobs = {}  # job_id -> job dict, in submission order
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"prediction-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def reserve(self):
+        """
+        Claims a backlog slot for a later submit(..., reserved=True); raises
+        QueueFull if there is none. Give it back with release() if no job
+        ends up being submitted; once submit() is called it owns the slot,
+        and releases it itself if it fails.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"Job queue is full ({self.max_pending} pending)")
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, payload, reserved=False, **fields):
+        if not reserved:
+            self.reserve()
+        try:
+            return self._enqueue(payload, fields)
+        except BaseException:
+            self.release()
+            raise
+
+    def _enqueue(self, payload, fields):
+        self._start_workers()
+        job_id = f"job_{uuid.uuid4().hex[:12]}"
+        job = {
+            "id": job_id,
+            "state": "queued",
+            "stage": "queued",
+            "progress": 0.0,
+            "done": 0,
+            "total": 0,
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "result": None,
+        }
+        job.update(fields)
+
+        with self._lock:
+            self._jobs[job_id] = job
+        self._publish(self._public(job))
+        self._pending.put((job_id, payload))  # Never blocks: the slot was taken above
+        return self.get(job_id)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or all(job.get(key) == value for key, value in fields.items()):
+                return  # Nothing changed, nothing to publish
+            job.update(fields)
+            public = self._public(job)
+        self._publish(public)
+
+    def _publish(self, public):
+        self.state.publish_job(public)
+        if self.on_change:
+            try:
+                self.on_change(public)
+            except Exception as e:
+                print(f"❌ ERROR: Job change listener failed: {str(e)}")
+
+    def _work(self):
+        while True:
+            job_id, payload = self._pending.get()
+            self._slots.release()  # Running jobs no longer count against the backlog
+            self._update(job_id, state="running", stage="starting", started_at=datetime.now().isoformat())
+
+            def report(stage, done=0, total=0, job_id=job_id):
+                progress = round(done / total, 4) if total else 0.0
+                self._update(job_id, stage=stage, progress=progress, done=done, total=total)
+
+            try:
+                result = self.handler(job_id, payload, report)
+                self._update(
+                    job_id, state="done", stage="done", progress=1.0,
+                    finished_at=datetime.now().isoformat(), result=result,
+                )
+            except Exception as e:
+                print(f"❌ ERROR in job {job_id}: {str(e)}")
+                self._update(
+                    job_id, state="failed", stage="failed",
+                    finished_at=datetime.now().isoformat(), error=str(e),
+                )
+            finally:
+                self._pending.task_done()
+                self._prune()
+
+    def _prune(self):
+        with self._lock:
+            finished = [jid for jid, job in self._jobs.items() if job["state"] in ("done", "failed")]
+            for jid in finished[:max(0, len(finished) - self.retention)]:
+                del self._jobs[jid]
+        self.state.prune_jobs(self.retention)
+
+    @staticmethod
+    def _public(job):
+        public = {k: v for k, v in job.items() if not k.startswith("_")}
+        if isinstance(public.get("result"), dict):
+            public["result"] = {k: v for k, v in public["result"].items() if not k.startswith("_")}
+        return public
+
+    def get(self, job_id, private=False):
+        """
+        The job's fields; private ones only for jobs run by this process.
+        Jobs from other processes come from the shared state, public fields only.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job) if private else self._public(job)
+        return self.state.get_job(job_id)
+
+    def list(self):
+        return self.state.list_jobs()
+
+    def backlog(self):
+        """Jobs waiting for a worker plus jobs currently running."""
+        return self.state.backlog()
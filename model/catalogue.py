@@ -0,0 +1,97 @@
+import os
+import threading
+import pandas as pd
+import numpy as np
+
+# === Configuration ===
+CVE_LOG_PATH = "/home/ec2-user/model/cve_log.csv"
+
+# Fixed dtypes so every reload produces the same column layout
+# Ref: https://pandas.pydata.org/docs/user_guide/categorical.html
+CVE_DTYPES = {
+    "CVE_ID": "object",
+    "Product": "category",
+    "CVSS_Score": "float64",
+    "Exploit_Status": "category",
+    "Patch_Availability": "category",
+    "Description": "object",
+    "Severity": "category",
+    "Timestamp": "object",
+}
+
+# === Preindexed CVE Catalogue ===
+class CveCatalogue:
+    """
+    In-memory copy of cve_log.csv shared by the engine and the API routes.
+
+    The CSV is parsed once with fixed dtypes, the CVE-only model features
+    (Normalized_CVSS and the CVE one-hot columns) are computed up front, and
+    row positions are indexed per Product. The file's mtime is checked on
+    every access and the whole snapshot is rebuilt and swapped in when it changes.
+    """
+
+    def __init__(self, path=CVE_LOG_PATH):
+        self.path = path
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _build(self, mtime):
+        frame = pd.read_csv(self.path, dtype=CVE_DTYPES)
+
+        # CVE-side features, same definitions as features.FeatureEncoder
+        frame["Normalized_CVSS"] = frame["CVSS_Score"] / 10
+        frame["Exploit_Status_Yes"] = (frame["Exploit_Status"] == "Yes").astype(np.float64)
+        frame["Patch_Availability_Not Available"] = (
+            frame["Patch_Availability"] == "Not Available"
+        ).astype(np.float64)
+
+        # Ref: https://pandas.pydata.org/docs/reference/api/pandas.core.groupby.DataFrameGroupBy.indices.html
+        groups = frame.groupby("Product", observed=True, sort=False).indices
+        products = frame["Product"].dropna().unique().tolist()
+
+        # Most specific names first so "Microsoft Windows Kernel" beats "Microsoft Windows"
+        match_order = sorted(products, key=len, reverse=True)
+
+        print(f"✅ CVE Log Loaded: {self.path}, Rows: {len(frame)}, Products: {len(products)}")
+        return {
+            "mtime": mtime,
+            "frame": frame,
+            "groups": groups,
+            "products": products,
+            "match_order": match_order,
+        }
+
+    def snapshot(self):
+        mtime = os.stat(self.path).st_mtime
+        snapshot = self._snapshot
+        if snapshot and snapshot["mtime"] == mtime:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot["mtime"] != mtime:
+                snapshot = self._build(mtime)
+                self._snapshot = snapshot
+            return snapshot
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def products(self):
+        return list(self.snapshot()["products"])
+
+    def match_order(self):
+        """
+        Product names in the priority used to match Software_Version strings.
+        """
+        return self.snapshot()["match_order"]
+
+    def rows_for(self, products):
+        """
+        Returns the catalogue rows for the given products, in file order.
+        """
+        snapshot = self.snapshot()
+        positions = [snapshot["groups"][p] for p in products if p in snapshot["groups"]]
+        if not positions:
+            return snapshot["frame"].iloc[0:0]
+        return snapshot["frame"].iloc[np.sort(np.concatenate(positions))]
@@ -0,0 +1,401 @@
+import os
+import time
+import pandas as pd
+import numpy as np
+
+from registry import ModelRegistry
+from catalogue import CveCatalogue
+from features import encoder_for, cross_join_indices, as_model_input, unique_rows
+from score_cache import row_fingerprints
+from results import ResultWriter, DEFAULT_SCHEMA
+
+# === Configuration Paths ===
+MODEL_DIR = "/home/ec2-user/model"
+PREDICTIONS_FOLDER = "/home/ec2-user/predictions"
+DEFAULT_MODEL_NAME = "daiverp_rf_model_V1.pkl"
+
+# === Scoring Configuration ===
+# Upper bound on CVE x system pairs built, scored and written at once; bounds peak memory
+SCORING_CHUNK_ROWS = int(os.getenv("DAIVERP_CHUNK_ROWS", "200000"))
+# Scores are kept as float32 from the score tables to the output columns
+SCORE_DTYPE = np.float32
+# Rows per model.predict call; unset means "use the auto-tuned value"
+BATCH_SIZE_OVERRIDE = int(os.getenv("DAIVERP_BATCH_SIZE", "0")) or None
+DEFAULT_BATCH_SIZE = 500
+BATCH_SIZE_CANDIDATES = [500, 2000, 8000, 32000]
+# System log rows parsed per read_csv chunk; bounds the memory used by ingestion
+INGEST_CHUNK_ROWS = int(os.getenv("DAIVERP_INGEST_ROWS", "100000"))
+
+# === System Log Columns Read at Ingestion ===
+# Everything else in an upload (Owner, Configuration_Details, ...) is never parsed.
+# Historical_Attack_Data is a CVE-side feature and comes from the CVE catalogue.
+SYSTEM_LOG_DTYPES = {
+    "System_ID": "object",
+    "Software_Version": "object",
+    "Criticality_Level": "category",
+    "Network_Access_Level": "category",
+    "Patch_Level": "category",
+}
+
+# === Required One-Hot Feature Columns for Model ===
+REQUIRED_FEATURES = [
+    "Historical_Attack_Data",
+    "Criticality_Weight",
+    "Normalized_CVSS",
+    "Exploit_Status_Yes",
+    "Patch_Availability_Not Available",
+    "Network_Access_Level_Public",
+    "Patch_Level_Up-to-date"
+]
+
+# === Vectorized Product Extraction ===
+def extract_products(software_versions, products):
+    """
+    Maps each Software_Version to the first product in `products` it contains
+    (case-insensitive), or None when nothing matches.
+
+    Matching runs once per distinct version string rather than once per row:
+    the column is factorized, each product is tested against all uniques with
+    one vectorized str.contains, and the winning product is gathered back
+    through the factorized codes.
+
+    Ref: https://pandas.pydata.org/docs/reference/api/pandas.factorize.html
+    """
+    codes, uniques = pd.factorize(software_versions)
+    lowered = pd.Series([u.lower() if isinstance(u, str) else "" for u in uniques], dtype=object)
+
+    # Walk products in reverse so earlier entries overwrite later ones (first match wins)
+    winner = np.full(len(uniques) + 1, -1)  # trailing slot catches NaN codes (-1)
+    for i in range(len(products) - 1, -1, -1):
+        hit = lowered.str.contains(products[i].lower(), regex=False).to_numpy()
+        winner[:-1][hit] = i
+
+    choices = np.array(list(products) + [None], dtype=object)
+    return pd.Series(choices[winner[codes]], index=software_versions.index, dtype=object)
+
+# === Streaming System Log Ingestion ===
+def read_system_log(system_file, chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Yields the system log as DataFrames of at most `chunk_rows` rows, parsing
+    only the SYSTEM_LOG_DTYPES columns. `system_file` may be a path or any
+    readable file object.
+
+    Ref: https://pandas.pydata.org/docs/user_guide/io.html#iterating-through-files-chunk-by-chunk
+    """
+    reader = pd.read_csv(
+        system_file,
+        usecols=lambda column: column in SYSTEM_LOG_DTYPES,
+        dtype=SYSTEM_LOG_DTYPES,
+        chunksize=chunk_rows,
+    )
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+def ingest_system_log(system_file, match_order, encoder, chunk_rows=INGEST_CHUNK_ROWS, report=None):
+    """
+    Reads the system log chunk by chunk and keeps only what scoring needs for
+    each matched system: its System_ID, its Product and the index of its
+    encoded feature row among the distinct rows seen so far. Raw chunks are
+    dropped as soon as they are encoded, so memory grows with the number of
+    matched systems, not with the size of the upload.
+
+    Returns a dict with system_ids, products, codes, rows (the distinct
+    encoded feature rows), product_counts, the total rows read, the time
+    spent and the feature names the rows were encoded for.
+    """
+    started = time.perf_counter()
+    version_products = {}  # Software_Version -> matched product (or None), across chunks
+    row_codes = {}         # encoded row bytes -> distinct row index, across chunks
+    distinct_rows = []
+    system_ids, products, codes = [], [], []
+    product_counts = {}
+    total_rows = 0
+
+    for chunk in read_system_log(system_file, chunk_rows):
+        total_rows += len(chunk)
+        if report:
+            report("reading", total_rows, 0)
+
+        # Match catalogue products based on version info, once per distinct version string
+        versions = chunk['Software_Version'].fillna("")
+        unseen = [v for v in versions.unique() if v not in version_products]
+        if unseen:
+            version_products.update(zip(unseen, extract_products(pd.Series(unseen, dtype=object), match_order)))
+        chunk_products = versions.map(version_products)
+        for product, count in chunk_products.value_counts(dropna=False).items():
+            product_counts[product] = product_counts.get(product, 0) + count
+
+        # Remove unmatched records
+        matched = chunk_products.notna().to_numpy()
+        if not matched.any():
+            continue
+        chunk = chunk[matched]
+
+        local_codes, local_rows = unique_rows(encoder.encode_systems(chunk))
+        lookup = np.empty(len(local_rows), dtype=np.intp)
+        for k, row in enumerate(local_rows):
+            key = row.tobytes()
+            if key not in row_codes:
+                row_codes[key] = len(distinct_rows)
+                distinct_rows.append(row)
+            lookup[k] = row_codes[key]
+
+        system_ids.append(chunk['System_ID'].to_numpy(dtype=object))
+        products.append(chunk_products[matched].to_numpy(dtype=object))
+        codes.append(lookup[local_codes])
+
+    width = len(encoder.system_specs)
+    return {
+        "system_ids": np.concatenate(system_ids) if system_ids else np.empty(0, dtype=object),
+        "products": np.concatenate(products) if products else np.empty(0, dtype=object),
+        "codes": np.concatenate(codes) if codes else np.empty(0, dtype=np.intp),
+        "rows": np.array(distinct_rows, dtype=np.float64).reshape(len(distinct_rows), width),
+        "product_counts": product_counts,
+        "total_rows": total_rows,
+        "seconds": time.perf_counter() - started,
+        "feature_names": encoder.feature_names,
+    }
+
+# === Helper: Score one block of model input rows ===
+def score_block(model_input, model, feature_names, batch_size=DEFAULT_BATCH_SIZE):
+    # Run predictions in batches
+    predictions = np.empty(len(model_input), dtype=np.float64)
+    for i in range(0, len(model_input), batch_size):
+        batch = as_model_input(model_input[i: i + batch_size], feature_names)
+        predictions[i: i + batch_size] = model.predict(batch)  # Ref: https://scikit-learn.org/stable/modules/generated/sklearn.ensemble.RandomForestRegressor.html
+    return predictions
+
+# === Batch Size Auto-Tuner ===
+def tune_batch_size(model, candidates=BATCH_SIZE_CANDIDATES, sample_rows=64000):
+    """
+    Times model.predict on synthetic rows for each candidate batch size and
+    returns (best_batch_size, {batch_size: rows_per_sec}).
+    """
+    feature_names = list(getattr(model, "feature_names_in_", REQUIRED_FEATURES))
+    sample = np.random.default_rng(0).random((sample_rows, len(feature_names)))
+    rates = {}
+    for batch_size in candidates:
+        started = time.perf_counter()
+        score_block(sample, model, feature_names, batch_size)
+        rates[batch_size] = round(sample_rows / (time.perf_counter() - started))
+    best = max(rates, key=rates.get)
+    return best, rates
+
+# === Helper: Score every CVE of a product against its distinct system rows ===
+def score_product(model, encoder, buffer, cve_block, cve_positions, system_rows, distinct_codes,
+                  cve_ids, cve_fps, system_fps, score_cache=None, model_hash=None,
+                  batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Returns an (n_cves, n_distinct) SCORE_DTYPE array of scores. Pairs found
+    in the score cache are served from it; the rest are assembled into
+    `buffer`, scored with the model and written back to the cache.
+    """
+    cve_local, code_local = cross_join_indices(np.arange(len(cve_positions)), np.arange(len(distinct_codes)))
+    cve_idx = cve_positions[cve_local]
+    code_idx = distinct_codes[code_local]
+    scores = np.empty(len(cve_idx), dtype=SCORE_DTYPE)
+    missing = np.arange(len(cve_idx))
+
+    if score_cache is not None and model_hash:
+        pair_cves = [cve_ids[i] for i in cve_idx]
+        pair_fps = [f"{system_fps[c]}{cve_fps[i]}" for i, c in zip(cve_idx, code_idx)]
+        cached = score_cache.lookup(model_hash, pair_cves, pair_fps)
+        found = np.array([(c, f) in cached for c, f in zip(pair_cves, pair_fps)], dtype=bool)
+        for k in np.flatnonzero(found):
+            scores[k] = cached[(pair_cves[k], pair_fps[k])]
+        missing = np.flatnonzero(~found)
+
+    for start in range(0, len(missing), len(buffer)):
+        rows = missing[start: start + len(buffer)]
+        model_input = encoder.assemble(cve_block, system_rows, cve_idx[rows], code_idx[rows], buffer)
+        scores[rows] = score_block(model_input, model, encoder.feature_names, batch_size)
+
+    if score_cache is not None and model_hash and len(missing):
+        score_cache.store(
+            model_hash,
+            [pair_cves[k] for k in missing],
+            [pair_fps[k] for k in missing],
+            scores[missing],
+        )
+
+    return scores.reshape(len(cve_positions), len(distinct_codes))
+
+# === Match System Log to CVE Data and Run Predictions ===
+def match_and_predict(system_file, catalogue, model, output_file=None, progress=None,
+                      sample_size=None, chunk_rows=SCORING_CHUNK_ROWS, score_cache=None, model_hash=None,
+                      batch_size=DEFAULT_BATCH_SIZE, systems=None, schema=DEFAULT_SCHEMA, formats=None):
+    """
+    Scores every CVE x system pair that shares a Product.
+
+    The system log is streamed in chunks by ingest_system_log, so only the
+    matched systems' IDs, products and feature-row indices are kept. Callers
+    that already ingested the log (e.g. while the upload was arriving) pass
+    the result as `systems` and `system_file` is not read.
+
+    CVE-side and system-side features are encoded once per run by a
+    FeatureEncoder fixed to the model's schema. Systems with identical
+    feature rows always get identical scores, so for each product the model
+    only scores its CVEs against the distinct system rows (served from
+    `score_cache` when one is given, keyed by `model_hash`). Output pairs are
+    then gathered product by product, in chunks of systems sized so that no
+    block exceeds `chunk_rows` pairs, and each block is written to disk
+    before the next one is built, so memory stays bounded by `chunk_rows`
+    and the distinct-row score tables however many pairs the run produces.
+    Rows come out grouped by product, in catalogue order.
+
+    The result is written next to `output_file` in `formats` (CSV and/or
+    Parquet / Arrow IPC, default results.RESULT_FORMATS) by a
+    results.ResultWriter, which is returned once every file is in place;
+    CSVs use output `schema` 1 (percent strings) or 2 (numeric scores).
+    Passing `sample_size` restores the old behaviour of downsampling both
+    sides to at most that many rows.
+    """
+    # progress(stage, done, total) lets callers such as the job queue follow the run
+    report = progress or (lambda stage, done=0, total=0: None)
+
+    # Each side's features are encoded once, in the model's schema, and gathered per pair
+    encoder = encoder_for(getattr(model, "feature_names_in_", REQUIRED_FEATURES))
+    if systems is None:
+        systems = ingest_system_log(system_file, catalogue.match_order(), encoder, report=report)
+    elif systems['feature_names'] != encoder.feature_names:
+        raise ValueError("❌ ERROR: System log was encoded for a different model schema")
+    print(f"✅ System Log Streamed: {systems['total_rows']} rows, {len(systems['system_ids'])} matched")
+    report("matching")
+    print(f"🧠 Extracted product counts:\n{pd.Series(systems['product_counts'], dtype='int64')}")
+
+    matching_products = set(catalogue.products()) & set(systems['products'])
+    print(f"🔍 Matching products found: {matching_products}")
+    cve_df = catalogue.rows_for(matching_products)
+
+    keep = np.arange(len(systems['system_ids']))
+    if sample_size:
+        cve_df = cve_df.sample(n=min(sample_size, len(cve_df)), random_state=42)
+        # Same positions DataFrame.sample would draw from the matched systems
+        keep = pd.Series(keep).sample(n=min(sample_size, len(keep)), random_state=42).to_numpy()
+    system_ids = systems['system_ids'][keep]
+    system_products = systems['products'][keep]
+    system_codes = systems['codes'][keep]
+    system_rows = systems['rows']
+
+    # Only CVEs whose product has systems end up in a pair
+    cve_df = cve_df[cve_df['Product'].isin(set(system_products))]
+    if cve_df.empty:
+        raise ValueError("❌ ERROR: No matching products found between System Log and CVE Log!")
+
+    # One normalization scale for the whole run, as if the pairs were merged at once
+    attack_data_max = cve_df['Historical_Attack_Data'].max()
+
+    cve_groups = cve_df.groupby('Product', observed=True, sort=False).indices
+    system_groups = pd.DataFrame({'Product': system_products}).groupby('Product', sort=False).indices
+    products = [p for p in cve_df['Product'].unique() if p in system_groups]
+    total_pairs = sum(len(cve_groups[p]) * len(system_groups[p]) for p in products)
+    print(f"📊 Pairs to score: {total_pairs}")
+
+    cve_block = encoder.encode_cves(cve_df, attack_data_max)
+    buffer = encoder.allocate(chunk_rows)
+    cve_ids = cve_df['CVE_ID'].to_numpy()
+    cve_products = cve_df['Product'].to_numpy()
+    print(f"🧮 Distinct system feature rows: {len(system_rows)}")
+
+    # Fingerprints are only needed to key the score cache
+    cve_fps = row_fingerprints(cve_block) if score_cache is not None else None
+    system_fps = row_fingerprints(system_rows) if score_cache is not None else None
+
+    # Each block is written out as soon as it is scored; nothing is kept between blocks
+    output_path = output_file if output_file else os.path.join(PREDICTIONS_FOLDER, "predictions.csv")
+    writer = ResultWriter(output_path, formats, schema, attrs={
+        "system_rows": systems['total_rows'],
+        "matched_rows": len(systems['system_ids']),
+        "ingest_seconds": systems['seconds'],
+    })
+    scored = 0
+    try:
+        for product in products:
+            report("scoring", scored, total_pairs)
+            product_cves = cve_groups[product]
+            product_systems = system_groups[product]
+            distinct_codes, local_codes = np.unique(system_codes[product_systems], return_inverse=True)
+            table = score_product(
+                model, encoder, buffer, cve_block, product_cves, system_rows, distinct_codes,
+                cve_ids, cve_fps, system_fps, score_cache, model_hash, batch_size,
+            )
+
+            step = max(1, chunk_rows // len(product_cves))
+            for start in range(0, len(product_systems), step):
+                report("scoring", scored, total_pairs)
+                cve_local, system_local = cross_join_indices(
+                    np.arange(len(product_cves)), np.arange(start, min(start + step, len(product_systems)))
+                )
+                cve_idx = product_cves[cve_local]
+                system_idx = product_systems[system_local]
+                writer.write(
+                    cve_ids[cve_idx],
+                    system_ids[system_idx],
+                    cve_products[cve_idx],
+                    table[cve_local, local_codes[system_local]],
+                )
+                scored += len(cve_idx)
+
+        report("writing", scored, total_pairs)
+        writer.close()
+    except BaseException:
+        writer.abort()  # No half-written result is left behind
+        raise
+    return writer
+
+# === In-Process Prediction Engine ===
+class PredictionEngine:
+    """
+    Keeps the Random Forest models (through a ModelRegistry) and the CVE log
+    (through a CveCatalogue) in memory so that each prediction only pays for
+    matching and inference.
+
+    One instance is created by server.py for the lifetime of the Flask app,
+    and predict.py builds a short-lived one for CLI runs. An optional
+    ScoreCache lets repeat uploads skip model.predict for pairs seen before.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, cve_file=None, registry=None, catalogue=None, score_cache=None,
+                 backend=None):
+        self.model_dir = model_dir
+        self.backend = backend  # None -> the registry's default (DAIVERP_BACKEND)
+        self.registry = registry or ModelRegistry(model_dir)
+        self.catalogue = catalogue or CveCatalogue(cve_file or os.path.join(model_dir, "cve_log.csv"))
+        self.cve_file = self.catalogue.path
+        self.score_cache = score_cache
+        self.batch_size = BATCH_SIZE_OVERRIDE or DEFAULT_BATCH_SIZE
+        self.batch_rates = {}
+
+    def get_model(self, model_name=DEFAULT_MODEL_NAME):
+        return self.registry.get(model_name, self.backend)
+
+    def tune(self, model_name=DEFAULT_MODEL_NAME):
+        """
+        Picks the batch size with the best rows/sec on this host, unless
+        DAIVERP_BATCH_SIZE pins one.
+        """
+        if BATCH_SIZE_OVERRIDE:
+            print(f"⚙️ Batch size fixed by DAIVERP_BATCH_SIZE: {self.batch_size}")
+            return self.batch_size
+        self.batch_size, self.batch_rates = tune_batch_size(self.get_model(model_name))
+        print(f"⚙️ Batch size auto-tuned to {self.batch_size} (rows/sec: {self.batch_rates})")
+        return self.batch_size
+
+    def ingest(self, system_file, model_name=DEFAULT_MODEL_NAME, progress=None):
+        """
+        Streams a system log (path or file object) into the compact form
+        match_and_predict(systems=...) scores, encoded for `model_name`.
+        """
+        model = self.get_model(model_name)
+        encoder = encoder_for(getattr(model, "feature_names_in_", REQUIRED_FEATURES))
+        return ingest_system_log(system_file, self.catalogue.match_order(), encoder, report=progress)
+
+    def match_and_predict(self, system_file, model_name=DEFAULT_MODEL_NAME, output_file=None, progress=None,
+                          sample_size=None, systems=None, schema=DEFAULT_SCHEMA, formats=None):
+        model, model_hash = self.registry.get_versioned(model_name, self.backend)
+        return match_and_predict(
+            system_file, self.catalogue, model, output_file, progress, sample_size,
+            score_cache=self.score_cache, model_hash=model_hash, batch_size=self.batch_size,
+            systems=systems, schema=schema, formats=formats,
+        )
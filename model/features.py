@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+
+# === Feature Sources ===
+# CVE-side columns depend only on the CVE row, system-side columns only on the system row
+NUMERIC_FEATURES = {
+    "Historical_Attack_Data": "cve",
+    "Normalized_CVSS": "cve",
+    "Criticality_Weight": "system",
+}
+# One-hot features are named "<column>_<category>", as produced by pd.get_dummies
+CATEGORICAL_COLUMNS = {
+    "Exploit_Status": "cve",
+    "Patch_Availability": "cve",
+    "Network_Access_Level": "system",
+    "Patch_Level": "system",
+}
+
+# Convert text-based severity to weight
+CRITICALITY_WEIGHTS = {"High": 1.0, "Medium": 0.7, "Low": 0.4}
+
+# === Helper: Resolve one model feature name to its source ===
+def parse_feature(name):
+    """
+    Returns (side, column, category) for a model feature name, where
+    category is None for numeric features.
+    """
+    if name in NUMERIC_FEATURES:
+        return NUMERIC_FEATURES[name], name, None
+    for column, side in CATEGORICAL_COLUMNS.items():
+        if name.startswith(f"{column}_"):
+            return side, column, name[len(column) + 1:]
+    raise ValueError(f"❌ ERROR: Missing required features: ['{name}']")
+
+# === Deterministic Feature Encoder ===
+class FeatureEncoder:
+    """
+    Encodes CVE and system rows straight into the model's column layout.
+
+    The schema is fixed once from the model's feature names, so every
+    one-hot column exists whatever categories a batch happens to contain
+    (unlike pd.get_dummies(drop_first=True)). Each side is encoded once per
+    run into a float64 block holding only that side's columns; assemble()
+    then gathers both blocks into a preallocated float64 matrix already in
+    model.feature_names_in_ order.
+    """
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        specs = [(j, *parse_feature(name)) for j, name in enumerate(self.feature_names)]
+        self.cve_specs = [(column, category) for j, side, column, category in specs if side == "cve"]
+        self.system_specs = [(column, category) for j, side, column, category in specs if side == "system"]
+        self.cve_columns = [j for j, side, column, category in specs if side == "cve"]
+        self.system_columns = [j for j, side, column, category in specs if side == "system"]
+
+    @staticmethod
+    def _indicator(df, column, category):
+        # Reuse one-hot columns precomputed by the CVE catalogue when present
+        name = f"{column}_{category}"
+        if name in df.columns:
+            return df[name].to_numpy(dtype=np.float64)
+        return (df[column] == category).to_numpy(dtype=np.float64)
+
+    def encode_cves(self, cve_df, attack_data_max):
+        block = np.empty((len(cve_df), len(self.cve_specs)), dtype=np.float64)
+        for k, (column, category) in enumerate(self.cve_specs):
+            if category is not None:
+                block[:, k] = self._indicator(cve_df, column, category)
+            elif column == "Historical_Attack_Data":
+                attack_data = cve_df[column].to_numpy(dtype=np.float64)
+                block[:, k] = attack_data / attack_data_max if attack_data_max != 0 else attack_data
+            elif "Normalized_CVSS" in cve_df.columns:
+                block[:, k] = cve_df["Normalized_CVSS"].to_numpy(dtype=np.float64)
+            else:
+                block[:, k] = cve_df["CVSS_Score"].to_numpy(dtype=np.float64) / 10
+        return block
+
+    def encode_systems(self, system_df):
+        block = np.empty((len(system_df), len(self.system_specs)), dtype=np.float64)
+        for k, (column, category) in enumerate(self.system_specs):
+            if category is not None:
+                block[:, k] = self._indicator(system_df, column, category)
+            else:
+                block[:, k] = system_df["Criticality_Level"].map(CRITICALITY_WEIGHTS).to_numpy(dtype=np.float64)
+        return block
+
+    def allocate(self, max_rows):
+        return np.empty((max_rows, len(self.feature_names)), dtype=np.float64)
+
+    def assemble(self, cve_block, system_block, cve_idx, system_idx, out):
+        """
+        Writes the feature rows for each (cve_idx[i], system_idx[i]) pair into
+        the first len(cve_idx) rows of `out` and returns that view.
+
+        Ref: https://numpy.org/doc/stable/user/basics.indexing.html#integer-array-indexing
+        """
+        matrix = out[:len(cve_idx)]
+        matrix[:, self.cve_columns] = cve_block[cve_idx]
+        matrix[:, self.system_columns] = system_block[system_idx]
+        return matrix
+
+# === Cached Encoder per Feature Schema ===
+@lru_cache(maxsize=8)
+def _encoder(feature_names):
+    return FeatureEncoder(feature_names)
+
+def encoder_for(feature_names):
+    return _encoder(tuple(feature_names))
+
+# === Helper: Cross-Join Indices ===
+def cross_join_indices(cve_positions, system_positions):
+    """
+    Every (cve, system) combination of the two position arrays, CVE-major,
+    matching the row order of pd.merge(cve_rows, system_rows, on="Product").
+    """
+    cve_idx = np.repeat(cve_positions, len(system_positions))
+    system_idx = np.tile(system_positions, len(cve_positions))
+    return cve_idx, system_idx
+
+# === Helper: Wrap a matrix for sklearn without copying ===
+def as_model_input(matrix, feature_names):
+    # Named columns keep sklearn from warning about missing feature names
+    return pd.DataFrame(matrix, columns=list(feature_names), copy=False)
+
+# === Helper: Distinct feature rows ===
+def unique_rows(block):
+    """
+    Returns (codes, rows): the distinct rows of `block` and, for every input
+    row, the index of its distinct row. Rows are compared bytewise so NaN
+    weights (unknown criticality) group together.
+    """
+    rows = np.ascontiguousarray(block)
+    keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+    _, first, codes = np.unique(keys, return_index=True, return_inverse=True)
+    return codes.ravel(), rows[first]
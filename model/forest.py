@@ -0,0 +1,141 @@
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+
+# sklearn marks leaves with feature == -2 and children == -1
+# Ref: https://scikit-learn.org/stable/auto_examples/tree/plot_unveil_tree_structure.html
+TREE_LEAF = -1
+
+# === Compiled Random Forest ===
+class CompiledForest:
+    """
+    Flat-array copy of a fitted RandomForestRegressor.
+
+    Every tree's nodes are concatenated into contiguous numpy arrays
+    (feature, threshold, left, right, value), with leaves pointing back at
+    themselves. predict() walks all trees for a whole batch at once: each
+    step is one vectorized gather over (trees x samples), repeated max_depth
+    times, then the leaf values are averaged across trees. There are no
+    per-estimator Python calls or thread dispatches, which dominate
+    sklearn's predict() on small batches with only a handful of features.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, missing_left, roots, max_depth, feature_names_in_):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.missing_left = missing_left
+        self.roots = roots
+        self.max_depth = max_depth
+        self.feature_names_in_ = feature_names_in_
+        self.n_features_in_ = len(feature_names_in_)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        if not hasattr(model, "estimators_") or getattr(model, "n_outputs_", 1) != 1:
+            raise TypeError("❌ ERROR: Only single-output fitted forests can be compiled")
+
+        features, thresholds, lefts, rights, values, missing, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == TREE_LEAF
+            own = np.arange(offset, offset + n)
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, own, tree.children_left + offset))
+            rights.append(np.where(is_leaf, own, tree.children_right + offset))
+            values.append(tree.value[:, 0, 0])
+            # Trees fitted by sklearn >= 1.3 record where NaNs go at each split
+            missing.append(getattr(tree, "missing_go_to_left", np.zeros(n, dtype=np.uint8)).astype(bool))
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        names = getattr(model, "feature_names_in_", None)
+        if names is None:
+            names = np.array([f"x{i}" for i in range(model.n_features_in_)], dtype=object)
+
+        return cls(
+            np.concatenate(features).astype(np.intp),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(lefts).astype(np.intp),
+            np.concatenate(rights).astype(np.intp),
+            np.concatenate(values).astype(np.float64),
+            np.concatenate(missing),
+            np.asarray(roots, dtype=np.intp),
+            max_depth,
+            names,
+        )
+
+    def predict(self, X, chunk_size=4096):
+        # sklearn compares float32 features against float64 thresholds; match its rounding
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32), dtype=np.float64)
+        predictions = np.empty(len(X), dtype=np.float64)
+
+        # Walk the forest a few thousand samples at a time so the (trees x samples)
+        # node arrays stay cache-sized
+        for start in range(0, len(X), chunk_size):
+            chunk = X[start: start + chunk_size]
+            n_samples, n_features = chunk.shape
+            flat_x = chunk.ravel()
+
+            # node[t, i] is the current node of tree t for sample i
+            node = np.repeat(self.roots[:, None], n_samples, axis=1)
+            row_offset = (np.arange(n_samples, dtype=np.intp) * n_features)[None, :]
+
+            for _ in range(self.max_depth):
+                x = flat_x[row_offset + self.feature[node]]
+                go_left = (x <= self.threshold[node]) | (np.isnan(x) & self.missing_left[node])
+                node = np.where(go_left, self.left[node], self.right[node])
+
+            predictions[start: start + n_samples] = self.value[node].mean(axis=0)
+        return predictions
+
+# === Parity Check Against sklearn ===
+def check_parity(model, compiled, X, atol=1e-9):
+    """
+    Raises ValueError if the compiled forest disagrees with model.predict on X.
+    """
+    expected = model.predict(X)
+    actual = compiled.predict(X)
+    worst = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+    if worst > atol:
+        raise ValueError(f"❌ ERROR: Compiled forest differs from sklearn by {worst}")
+    return worst
+
+# === Cached Compilation ===
+_compiled = weakref.WeakKeyDictionary()
+_compiled_lock = threading.Lock()
+
+def compile_forest(model, probe_rows=2048):
+    """
+    Compiles `model` once (cached per model object) and verifies it against
+    sklearn on a probe batch that includes every split threshold.
+    """
+    with _compiled_lock:
+        if model in _compiled:
+            return _compiled[model]
+
+    compiled = CompiledForest.from_sklearn(model)
+
+    rng = np.random.default_rng(0)
+    probe = rng.random((probe_rows, compiled.n_features_in_))
+    # Put each feature exactly on some split thresholds to exercise the <= boundary
+    internal = compiled.left != np.arange(len(compiled.left))
+    for j in range(compiled.n_features_in_):
+        cuts = compiled.threshold[internal & (compiled.feature == j) & np.isfinite(compiled.threshold)]
+        if len(cuts):
+            probe[: min(len(cuts), probe_rows // 2), j] = cuts[: probe_rows // 2]
+    # Named columns keep sklearn from warning about missing feature names
+    check_parity(model, compiled, pd.DataFrame(probe, columns=list(compiled.feature_names_in_)))
+
+    with _compiled_lock:
+        _compiled[model] = compiled
+    return compiled
@@ -1,13 +1,18 @@
 import numpy as np
 import json
 
+from registry import ModelRegistry
+from forest import compile_forest
+
 # === Main Inference Function ===
-def predict_fn(input_data, model):
+def predict_fn(input_data, model, backend="sklearn"):
     """
     Prepares input and sends it to the model for prediction.
 
     This function ensures the input shape is (n_samples, n_features),
-    which is required for scikit-learn models.
+    which is required for scikit-learn models. backend="compiled" evaluates
+    the forest with the flat-array evaluator in forest.py (compiled once per
+    model object) instead of sklearn.
 
     Ref: https://scikit-learn.org/stable/glossary.html#term-feature-matrix
     """
@@ -17,6 +22,8 @@ def predict_fn(input_data, model):
     input_data = np.array(input_data).reshape(-1, input_data.shape[-1])
     print("Inside predict_fn - Fixed input shape:", input_data.shape)
 
+    if backend == "compiled":
+        model = compile_forest(model)
     return model.predict(input_data)
 
 # === Format Output for Serving API ===
@@ -31,7 +38,12 @@ def output_fn(prediction, accept="application/json"):
     return type("Response", (object,), {"body": json.dumps(output), "status_code": 200})
 
 # === Load Trained RandomForest Model ===
-# Ref: https://joblib.readthedocs.io/en/latest/generated/joblib.load.html
-import joblib
-model = joblib.load("/home/ec2-user/model/daiverp_rf_model.pkl")
+# The registry loads the pickle on first use and reloads it when the file changes,
+# instead of unpickling it at import time.
+registry = ModelRegistry("/home/ec2-user/model")
 
+def model_fn(model_name="daiverp_rf_model.pkl", backend=None):
+    """
+    Returns the warm model for predict_fn (SageMaker-style model loader).
+    """
+    return registry.get(model_name, backend)
@@ -0,0 +1,133 @@
+import os
+import time
+import hashlib
+import threading
+import joblib
+
+from forest import compile_forest
+
+# === Configuration ===
+MODEL_DIR = "/home/ec2-user/model"
+
+# Model versions offered in the UI, keyed by the value sent from CSVUploader.js
+MODEL_FILES = {
+    "V1": "daiverp_rf_model_V1.pkl",
+    "V2": "daiverp_rf_model_V2.pkl",
+}
+
+# Set DAIVERP_MODEL_MMAP=r so worker processes share one read-only copy of the arrays
+# Ref: https://joblib.readthedocs.io/en/latest/generated/joblib.load.html
+DEFAULT_MMAP_MODE = os.getenv("DAIVERP_MODEL_MMAP") or None
+
+# Threads each forest uses in predict(); -1 means all cores
+# Ref: https://scikit-learn.org/stable/glossary.html#term-n_jobs
+DEFAULT_N_JOBS = int(os.getenv("DAIVERP_N_JOBS", "-1"))
+
+# "sklearn" serves the estimator as-is, "compiled" serves a forest.CompiledForest
+DEFAULT_BACKEND = os.getenv("DAIVERP_BACKEND", "sklearn")
+
+# === Helper: Content hash of a model file ===
+# Ref: https://docs.python.org/3/library/hashlib.html#file-hashing
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# === Warm Model Registry ===
+class ModelRegistry:
+    """
+    Loads each model pickle once and serves the same object to every request.
+
+    Entries are keyed by file name and checked against the file's mtime/size
+    on every lookup. When the pickle changes on disk, the new version is
+    loaded off to the side and swapped in with a single dict assignment, so
+    in-flight requests keep the model they started with. If the new file
+    cannot be loaded (e.g. it is still being copied), the old model stays live.
+    Forests get `n_jobs` set at load time so predict() fans out over cores.
+    With the "compiled" backend, lookups return a flat-array CompiledForest
+    built (and parity-checked) once per loaded model; if that fails, the
+    failure is remembered on the entry and the sklearn model is served
+    until the file changes.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, mmap_mode=DEFAULT_MMAP_MODE, n_jobs=DEFAULT_N_JOBS,
+                 backend=DEFAULT_BACKEND):
+        self.model_dir = model_dir
+        self.mmap_mode = mmap_mode
+        self.n_jobs = n_jobs
+        self.backend = backend
+        self._entries = {}  # model_name -> {"model", "mtime", "size", "sha256", "loaded_at"[, "compiled"]}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, model_name):
+        with self._locks_guard:
+            return self._locks.setdefault(model_name, threading.Lock())
+
+    def _load(self, model_name, stat):
+        model_path = os.path.join(self.model_dir, model_name)
+        model = joblib.load(model_path, mmap_mode=self.mmap_mode)
+        if hasattr(model, "n_jobs"):
+            model.n_jobs = self.n_jobs
+        entry = {
+            "model": model,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": file_sha256(model_path),
+            "loaded_at": time.time(),
+        }
+        print(f"✅ Model loaded successfully from: {model_path} (sha256 {entry['sha256'][:12]})")
+        return entry
+
+    def _entry(self, model_name):
+        model_path = os.path.join(self.model_dir, model_name)
+        stat = os.stat(model_path)
+        entry = self._entries.get(model_name)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry
+
+        # Only one thread reloads a given model; the others wait and reuse its result
+        with self._lock_for(model_name):
+            entry = self._entries.get(model_name)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                return entry
+            try:
+                new_entry = self._load(model_name, stat)
+            except Exception as e:
+                if entry is None:
+                    raise
+                print(f"❌ ERROR: Reload of {model_path} failed, keeping previous version: {str(e)}")
+                return entry
+            self._entries[model_name] = new_entry
+            return new_entry
+
+    def _serve(self, model_name, entry, backend):
+        if (backend or self.backend) != "compiled":
+            return entry["model"]
+        if "compiled" not in entry:
+            # Compiled once per loaded entry; None records a failure so it is not retried per request
+            with self._lock_for(model_name):
+                if "compiled" not in entry:
+                    try:
+                        entry["compiled"] = compile_forest(entry["model"])
+                    except Exception as e:
+                        print(f"❌ ERROR: Unable to compile {model_name}, serving the sklearn model: {str(e)}")
+                        entry["compiled"] = None
+        return entry["compiled"] or entry["model"]
+
+    def get(self, model_name, backend=None):
+        return self._serve(model_name, self._entry(model_name), backend)
+
+    def get_versioned(self, model_name, backend=None):
+        """Returns (model, sha256) from the same snapshot, even during a reload."""
+        entry = self._entry(model_name)
+        return self._serve(model_name, entry, backend), entry["sha256"]
+
+    def preload(self, model_names=None):
+        for model_name in (model_names or MODEL_FILES.values()):
+            try:
+                self.get(model_name)  # Also compiles it when the compiled backend is on
+            except Exception as e:
+                print(f"❌ ERROR: Unable to preload {model_name}: {str(e)}")
@@ -0,0 +1,488 @@
+import os
+import json
+import base64
+import zlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Optional fast JSON encoder; falls back to the standard library
+# Ref: https://github.com/ijl/orjson
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional columnar file formats (Parquet, Arrow IPC)
+# Ref: https://arrow.apache.org/docs/python/
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+OUTPUT_COLUMNS = ['CVE_ID', 'System_ID', 'Product', 'DAIVERP_Risk_Score']
+
+# === Output Schema Versions ===
+# 1: DAIVERP_Risk_Score as a "73.41%" string (what existing clients parse)
+# 2: DAIVERP_Risk_Score as the raw 0-1 model score, formatted by the client
+SCHEMA_PERCENT_STRING = 1
+SCHEMA_NUMERIC = 2
+SCHEMAS = (SCHEMA_PERCENT_STRING, SCHEMA_NUMERIC)
+DEFAULT_SCHEMA = int(os.getenv("DAIVERP_OUTPUT_SCHEMA", str(SCHEMA_PERCENT_STRING)))
+if DEFAULT_SCHEMA not in SCHEMAS:  # Fail at startup rather than on the first request
+    raise ValueError(f"❌ ERROR: DAIVERP_OUTPUT_SCHEMA must be one of {SCHEMAS}, got {DEFAULT_SCHEMA}")
+
+# === Stored Result Formats ===
+# format -> (file extension, MIME type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+BINARY_FORMATS = ("parquet", "arrow")
+# Formats written for each result; binary files always hold numeric (schema 2) scores
+RESULT_FORMATS = [
+    fmt.strip() for fmt in os.getenv("DAIVERP_RESULT_FORMATS", "parquet" if pa else "csv").split(",") if fmt.strip()
+]
+
+# Same bands as the dashboard's getSeverityLabel (lower bound in percent)
+SEVERITY_BANDS = [("Critical", 80), ("High", 60), ("Medium", 40), ("Low", 20), ("Very Low", None)]
+
+# Sort keys accepted by select(); "risk" sorts on the numeric score
+SORT_KEYS = {"risk": "DAIVERP_Risk_Score", "DAIVERP_Risk_Score": "DAIVERP_Risk_Score",
+             "CVE_ID": "CVE_ID", "System_ID": "System_ID", "Product": "Product"}
+
+# === Helper: Encode one value as JSON bytes ===
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+# === Helper: Format risk scores as percentages ===
+def format_risk_scores(scores):
+    # Formatted in float64 so float32 scores round like the original float64 ones
+    return (pd.Series(scores, dtype=np.float64) * 100).round(2).astype(str) + "%"
+
+# === Helper: Parse a requested schema version ===
+def parse_schema(value, default=DEFAULT_SCHEMA):
+    """Returns the schema version for a query/form value; raises ValueError if unknown."""
+    if value in (None, ""):
+        return default
+    schema = int(value)
+    if schema not in SCHEMAS:
+        raise ValueError(f"Unknown schema version: {value}")
+    return schema
+
+# === Helper: JSON-encode a column, once per distinct value ===
+def encode_column(values):
+    """
+    Returns a list with the JSON text of each value. Result columns repeat the
+    same IDs and products many times, so each distinct value is encoded once
+    and gathered back through its factorized code. Missing values become null.
+    """
+    codes, uniques = pd.factorize(values)
+    encoded = np.array(
+        [dumps(u if isinstance(u, str) else str(u)).decode("utf-8") for u in uniques] + ["null"],
+        dtype=object,
+    )
+    return encoded[codes].tolist()  # code -1 (missing) picks the trailing "null"
+
+# === Helper: JSON-encode numeric scores ===
+def encode_scores(scores):
+    """
+    Returns the JSON number text of each score, using the shortest repr of the
+    float32 value (0.7341 rather than 0.7340999841690063).
+    """
+    distinct, codes = np.unique(scores, return_inverse=True)
+    encoded = np.array([str(np.float32(v)) for v in distinct], dtype=object)
+    return encoded[codes.ravel()].tolist()
+
+# === Result Cursors ===
+def make_cursor(offset, query):
+    """
+    Opaque pagination cursor: the next row offset plus a checksum of the
+    query it belongs to, so a cursor can't be replayed against other filters.
+    """
+    token = json.dumps({"o": int(offset), "q": zlib.crc32(repr(query).encode("utf-8"))})
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii")
+
+def read_cursor(cursor, query):
+    """Returns the row offset stored in `cursor` (0 for no cursor); raises ValueError if invalid."""
+    if not cursor:
+        return 0
+    try:
+        token = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset = int(token["o"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if token.get("q") != zlib.crc32(repr(query).encode("utf-8")) or offset < 0:
+        raise ValueError("Cursor does not match this query")
+    return offset
+
+# === Columnar Prediction Result ===
+class PredictionResult:
+    """
+    Output of one prediction run, kept as parallel numpy columns.
+
+    Scores stay float32 and are only formatted when serialized: as "73.41%"
+    strings (once per distinct score) for schema 1, or as plain numbers for
+    schema 2. to_json() writes the response body directly from the columns,
+    iter_csv() / to_arrow() produce the text and tables a ResultWriter
+    stores, and `attrs` carries run metadata such as the number of system
+    log rows.
+
+    select() returns the row positions matching a filter/sort query; the
+    serializers take such a position array to emit only a page of rows.
+    """
+
+    def __init__(self, cve_ids, system_ids, products, scores, attrs=None):
+        self.cve_ids = cve_ids
+        self.system_ids = system_ids
+        self.products = products
+        self.scores = scores
+        self.attrs = dict(attrs or {})
+        self._selections = OrderedDict()  # query -> row positions, most recent last
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def risk_scores(self, rows=None, schema=SCHEMA_PERCENT_STRING):
+        scores = self.scores if rows is None else self.scores[rows]
+        if schema == SCHEMA_NUMERIC:
+            return scores
+        distinct, codes = np.unique(scores, return_inverse=True)
+        return format_risk_scores(distinct).to_numpy(dtype=object)[codes.ravel()]
+
+    def to_frame(self, rows=None, schema=SCHEMA_PERCENT_STRING):
+        take = (lambda column: column) if rows is None else (lambda column: column[rows])
+        return pd.DataFrame({
+            'CVE_ID': take(self.cve_ids),
+            'System_ID': take(self.system_ids),
+            'Product': take(self.products),
+            'DAIVERP_Risk_Score': self.risk_scores(rows, schema),
+        })
+
+    def records(self, rows=None, schema=SCHEMA_PERCENT_STRING):
+        # Parsed from the API encoding so numeric scores keep their short float32 form
+        return json.loads("[" + ",".join(self._encoded_rows(rows, schema)) + "]")
+
+    # === Filtering and Sorting ===
+    def _sort_key(self, column):
+        if column == "DAIVERP_Risk_Score":
+            return self.scores
+        values = {"CVE_ID": self.cve_ids, "System_ID": self.system_ids, "Product": self.products}[column]
+        codes, _ = pd.factorize(values, sort=True)  # Codes follow the sorted order of the values
+        return codes
+
+    def select(self, product=None, system_id=None, search=None, sort=None, order="desc"):
+        """
+        Row positions matching the filters, in the requested order.
+
+        `product` and `system_id` are exact matches, `search` is a
+        case-insensitive substring of CVE_ID or System_ID. `sort` is one of
+        SORT_KEYS (None keeps the engine's row order); ties keep that order.
+        The last few selections are cached so paging through one is cheap.
+        """
+        query = (product, system_id, (search or "").lower(), SORT_KEYS.get(sort), order)
+        with self._lock:
+            if query in self._selections:
+                self._selections.move_to_end(query)
+                return self._selections[query]
+
+        mask = np.ones(len(self), dtype=bool)
+        if product:
+            mask &= self.products == product
+        if system_id:
+            mask &= self.system_ids == system_id
+        if search:
+            mask &= _contains(self.cve_ids, query[2]) | _contains(self.system_ids, query[2])
+        rows = np.flatnonzero(mask)
+
+        if query[3]:
+            key = self._sort_key(query[3])[rows]
+            rows = rows[np.argsort(-key if order == "desc" else key, kind="stable")]
+
+        with self._lock:
+            self._selections[query] = rows
+            while len(self._selections) > 8:
+                self._selections.popitem(last=False)
+        return rows
+
+    def severity_counts(self, rows=None):
+        """Rows per SEVERITY_BANDS label, using the same rounded percent the API shows."""
+        scores = self.scores if rows is None else self.scores[rows]
+        percent = np.round(scores.astype(np.float64) * 100, 2)
+        counts, upper = {}, None
+        for label, lower in SEVERITY_BANDS:
+            in_band = np.ones(len(percent), dtype=bool) if lower is None else percent >= lower
+            if upper is not None:
+                in_band &= percent < upper
+            counts[label] = int(in_band.sum())
+            upper = lower
+        return counts
+
+    def product_names(self):
+        return pd.unique(self.products).tolist()
+
+    # === Serialization ===
+    def _encoded_rows(self, rows=None, schema=SCHEMA_PERCENT_STRING):
+        take = (lambda column: column) if rows is None else (lambda column: column[rows])
+        scores = self.risk_scores(rows, schema)
+        columns = [
+            encode_column(take(self.cve_ids)),
+            encode_column(take(self.system_ids)),
+            encode_column(take(self.products)),
+            encode_scores(scores) if schema == SCHEMA_NUMERIC else encode_column(scores),
+        ]
+        template = "{{" + ",".join(f'"{name}":{{}}' for name in OUTPUT_COLUMNS) + "}}"
+        return map(template.format, *columns)
+
+    def to_json(self, rows=None, schema=SCHEMA_PERCENT_STRING, **fields):
+        """
+        Returns the JSON body {**fields, "schema": n, "predictions": [{...}, ...]}
+        as bytes, built straight from the columns without intermediate row
+        dicts. `rows` limits the predictions to those positions, in that order.
+        """
+        body = ",".join(self._encoded_rows(rows, schema)).encode("utf-8")
+        head = dumps(dict(fields, schema=schema))[:-1] + b","
+        return head + b'"predictions":[' + body + b"]}"
+
+    def iter_ndjson(self, rows=None, schema=SCHEMA_PERCENT_STRING, chunk_rows=20000):
+        """
+        Yields the selected rows as newline-delimited JSON, `chunk_rows` rows
+        per chunk, for use as a streamed (generator) response body.
+        Ref: https://github.com/ndjson/ndjson-spec
+        """
+        rows = np.arange(len(self)) if rows is None else rows
+        for start in range(0, len(rows), chunk_rows):
+            lines = self._encoded_rows(rows[start: start + chunk_rows], schema)
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+    def iter_csv(self, rows=None, schema=DEFAULT_SCHEMA, header=True, chunk_rows=50000):
+        """Yields the selected rows as CSV text, `chunk_rows` rows at a time."""
+        rows = np.arange(len(self)) if rows is None else rows
+        if header:
+            yield ",".join(OUTPUT_COLUMNS) + "\n"
+        for start in range(0, len(rows), chunk_rows):
+            yield self.to_frame(rows[start: start + chunk_rows], schema).to_csv(index=False, header=False)
+
+    @classmethod
+    def from_arrow(cls, batch):
+        """Builds a result from a pyarrow Table or RecordBatch written by to_arrow()."""
+        frame = batch.to_pandas()
+        return cls(
+            frame['CVE_ID'].to_numpy(dtype=object),
+            frame['System_ID'].to_numpy(dtype=object),
+            frame['Product'].to_numpy(dtype=object),
+            frame['DAIVERP_Risk_Score'].to_numpy(dtype=np.float32),
+        )
+
+    def to_arrow(self, dictionary_encode=True):
+        """
+        Arrow table with dictionary-encoded CVE_ID and Product columns (each
+        repeats across many rows) and the float32 score. Pass
+        dictionary_encode=False for plain string columns, e.g. for batches of
+        one Arrow IPC file, which can't change dictionaries between batches.
+        Ref: https://arrow.apache.org/docs/python/generated/pyarrow.DictionaryArray.html
+        """
+        def dictionary(values):
+            if not dictionary_encode:
+                return pa.array(values, type=pa.string(), from_pandas=True)
+            codes, uniques = pd.factorize(values)
+            indices = pa.array(codes.astype(np.int32), mask=codes < 0)
+            return pa.DictionaryArray.from_arrays(indices, pa.array(uniques, type=pa.string()))
+
+        return pa.table(
+            {
+                'CVE_ID': dictionary(self.cve_ids),
+                'System_ID': pa.array(self.system_ids, type=pa.string(), from_pandas=True),
+                'Product': dictionary(self.products),
+                'DAIVERP_Risk_Score': pa.array(self.scores, type=pa.float32()),
+            },
+            metadata={"daiverp_schema": str(SCHEMA_NUMERIC)},
+        )
+
+# === Helper: Formats to write for one result ===
+def output_formats(formats=None):
+    """`formats` (default RESULT_FORMATS), reduced to CSV when pyarrow is not installed."""
+    wanted = list(formats or RESULT_FORMATS)
+    if pa is None and any(fmt in BINARY_FORMATS for fmt in wanted):
+        print("❌ ERROR: pyarrow is not installed, writing predictions as CSV instead")
+        wanted = ["csv"]
+    return list(dict.fromkeys(wanted))
+
+def output_file(output_path, fmt):
+    return output_path if output_path.endswith(FORMATS[fmt][0]) else stored_path(output_path, fmt)
+
+# === Incremental Result Writer ===
+class ResultWriter:
+    """
+    Writes a prediction result to disk chunk by chunk while it is computed.
+
+    Each write() appends one block of rows to every requested format: CSV
+    text (schema 1 or 2), a Parquet row group or an Arrow IPC record batch.
+    Nothing is kept in memory between blocks, so the caller's peak memory
+    depends on its block size, not on the size of the result. Files are
+    written under ".part" names that close() renames into place; abort()
+    deletes them. After close() the writer stands for the stored result:
+    len() is its row count, `attrs` carries run metadata and load() reads
+    it back as a PredictionResult.
+    """
+
+    def __init__(self, output_path, formats=None, schema=DEFAULT_SCHEMA, attrs=None):
+        self.path = output_path
+        self.schema = schema
+        self.attrs = dict(attrs or {})
+        self.rows = 0
+        self.paths = {fmt: output_file(output_path, fmt) for fmt in output_formats(formats)}
+        self._sinks = {}
+        try:
+            for fmt, path in self.paths.items():
+                self._sinks[fmt] = self._open(fmt, f"{path}.part")
+        except Exception:
+            self.abort()
+            raise
+
+    def _open(self, fmt, partial):
+        if fmt == "csv":
+            f = open(partial, "w", newline="")
+            f.write(",".join(OUTPUT_COLUMNS) + "\n")
+            return f
+        schema = _empty_result().to_arrow(dictionary_encode=fmt == "parquet").schema
+        if fmt == "parquet":
+            return pq.ParquetWriter(partial, schema, compression="zstd")
+        sink = pa.OSFile(partial, "wb")
+        return sink, pa.ipc.new_file(sink, schema)
+
+    def __len__(self):
+        return self.rows
+
+    def write(self, cve_ids, system_ids, products, scores):
+        block = PredictionResult(cve_ids, system_ids, products, scores)
+        for fmt, sink in self._sinks.items():
+            if fmt == "csv":
+                for text in block.iter_csv(schema=self.schema, header=False):
+                    sink.write(text)
+            elif fmt == "parquet":
+                sink.write_table(block.to_arrow())
+            else:
+                sink[1].write_table(block.to_arrow(dictionary_encode=False), max_chunksize=65536)
+        self.rows += len(block)
+
+    def _close_sinks(self):
+        while self._sinks:
+            fmt, sink = self._sinks.popitem()
+            if fmt == "arrow":
+                sink[1].close()
+                sink[0].close()
+            else:
+                sink.close()
+
+    def close(self):
+        self._close_sinks()
+        for path in self.paths.values():
+            os.replace(f"{path}.part", path)
+            print(f"✅ Predictions written to: {path}")
+        return list(self.paths.values())
+
+    def abort(self):
+        """Closes and deletes the partial files (e.g. after a failed run)."""
+        try:
+            self._close_sinks()
+        finally:
+            for path in self.paths.values():
+                if os.path.exists(f"{path}.part"):
+                    os.remove(f"{path}.part")
+
+    def load(self):
+        return load_stored(self.path, list(self.paths))
+
+def _empty_result():
+    empty = np.empty(0, dtype=object)
+    return PredictionResult(empty, empty, empty, np.empty(0, dtype=np.float32))
+
+# === Helper: Case-insensitive substring match on a column ===
+def _contains(values, needle):
+    codes, uniques = pd.factorize(values)
+    hits = pd.Series(uniques, dtype=object).str.lower().str.contains(needle, regex=False, na=False).to_numpy()
+    return np.append(hits, False)[codes]  # code -1 (missing) never matches
+
+# === Stored Result Files ===
+def stored_path(path, fmt):
+    """`path` with its extension replaced by `fmt`'s (no extension for fmt=None)."""
+    base = os.path.splitext(path)[0]
+    return base + FORMATS[fmt][0] if fmt else base
+
+def stored_formats(path):
+    """Formats for which a finished file of this result exists on disk."""
+    return [fmt for fmt in FORMATS if os.path.exists(stored_path(path, fmt))]
+
+def stored_csv_schema(path):
+    """Schema of a stored CSV, from its first score; None when it has no rows."""
+    with open(path, newline="") as f:
+        f.readline()  # Header
+        first = f.readline().rstrip("\r\n")
+    if not first:
+        return None
+    return SCHEMA_PERCENT_STRING if first.endswith("%") else SCHEMA_NUMERIC
+
+def iter_stored_csv(path, fmt, schema=DEFAULT_SCHEMA, batch_rows=65536):
+    """
+    Streams a stored Parquet / Arrow IPC result as CSV text, one record batch
+    at a time, so a large result is never loaded whole.
+    Ref: https://arrow.apache.org/docs/python/generated/pyarrow.parquet.ParquetFile.html
+    """
+    yield ",".join(OUTPUT_COLUMNS) + "\n"
+    if fmt == "parquet":
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch_rows)
+    else:
+        reader = pa.ipc.open_file(path)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    for batch in batches:
+        yield from PredictionResult.from_arrow(batch).iter_csv(schema=schema, header=False)
+
+# === Helper: Parse stored risk scores back to 0-1 floats ===
+def parse_risk_scores(values):
+    """Accepts schema 1 ("73.41%") and schema 2 (0.7341) values, returns float32 scores."""
+    text = pd.Series(values, dtype=object).astype(str)
+    percent = text.str.endswith("%").to_numpy()
+    numbers = pd.to_numeric(text.str.rstrip("%")).to_numpy(dtype=np.float64)
+    return np.where(percent, numbers / 100, numbers).astype(np.float32)
+
+def read_stored_csv(path):
+    """Builds a result from a stored CSV file of either schema version."""
+    frame = pd.read_csv(path, dtype=object)
+    return PredictionResult(
+        frame['CVE_ID'].to_numpy(dtype=object),
+        frame['System_ID'].to_numpy(dtype=object),
+        frame['Product'].to_numpy(dtype=object),
+        parse_risk_scores(frame['DAIVERP_Risk_Score']),
+    )
+
+def load_stored(path, formats=None):
+    """
+    Reads a finished result back from its stored Parquet, Arrow IPC or CSV
+    file (for a process that did not compute it), preferring the binary
+    formats. `formats` limits the files considered. Returns None if none of
+    them exists.
+    """
+    formats = [fmt for fmt in stored_formats(path) if formats is None or fmt in formats]
+    if pa is not None and "parquet" in formats:
+        return PredictionResult.from_arrow(pq.read_table(stored_path(path, "parquet")))
+    if pa is not None and "arrow" in formats:
+        with pa.memory_map(stored_path(path, "arrow")) as source:
+            return PredictionResult.from_arrow(pa.ipc.open_file(source).read_all())
+    if "csv" in formats:
+        # Schema 1 CSVs hold rounded percentages, so scores are exact to 2 decimal places
+        return read_stored_csv(stored_path(path, "csv"))
+    return None
+
+def output_pending(path):
+    """
+    True while any format of this result is still being written (a ResultWriter
+    in any process has its .part file open).
+    """
+    return any(os.path.exists(stored_path(path, fmt) + ".part") for fmt in FORMATS)
@@ -0,0 +1,144 @@
+import os
+import time
+import hashlib
+from sqlite_store import SQLiteStore
+
+# === Score Cache Configuration ===
+# Off by default: scoring distinct feature rows already skips repeated work, and a lookup
+# costs more than re-scoring for small forests. Worth it for large or slow models
+SCORE_CACHE_ENABLED = os.getenv("DAIVERP_SCORE_CACHE_ENABLED", "0") == "1"
+SCORE_CACHE_PATH = os.getenv("DAIVERP_SCORE_CACHE", "/home/ec2-user/cache/score_cache.sqlite")
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("DAIVERP_SCORE_CACHE_MAX", "2000000"))
+
+# A hit refreshes an entry's last-used time at most this often, so repeat runs read without rewriting
+TOUCH_INTERVAL = 3600
+
+# === Helper: Fingerprint feature rows ===
+def row_fingerprints(block):
+    """
+    Short hex digest of each encoded feature row (float64 bytes).
+    Ref: https://docs.python.org/3/library/hashlib.html#blake2
+    """
+    return [hashlib.blake2b(row.tobytes(), digest_size=8).hexdigest() for row in block]
+
+# === Persistent Score Cache ===
+class ScoreCache(SQLiteStore):
+    """
+    SQLite-backed cache of model scores.
+
+    Each entry is keyed by (model file sha256, CVE_ID, feature fingerprint).
+    The fingerprint joins the digest of the system's encoded feature row with
+    the digest of the CVE's encoded row, because Historical_Attack_Data is
+    normalized per run and a CVE's features can differ between uploads.
+    Entries carry a last-used timestamp; once the table grows past
+    `max_entries` the least recently used tenth is evicted. The entry count
+    and the hit and miss counts are kept in the same database, so stats()
+    reports the totals of every worker process sharing it, not just the one
+    that is asked.
+    """
+
+    def __init__(self, path=SCORE_CACHE_PATH, max_entries=SCORE_CACHE_MAX_ENTRIES):
+        super().__init__(path)
+        self.max_entries = max_entries
+
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS scores (
+                model_hash TEXT NOT NULL,
+                cve_id TEXT NOT NULL,
+                feature_fp TEXT NOT NULL,
+                score REAL NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model_hash, cve_id, feature_fp)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.executemany("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", [("hits",), ("misses",)])
+        conn.execute("INSERT OR IGNORE INTO counters (name, value) SELECT 'entries', COUNT(*) FROM scores")
+        conn.commit()
+
+    def lookup(self, model_hash, cve_ids, feature_fps):
+        """
+        Returns {(cve_id, feature_fp): score} for the requested keys found in the cache.
+
+        The keys are loaded into a temporary table and joined on the primary
+        key, so only the requested entries are read. Only hits not touched in
+        the last TOUCH_INTERVAL seconds get their last-used time rewritten.
+        Ref: https://www.sqlite.org/optoverview.html#manual_control_of_query_plans_using_cross_join
+        """
+        wanted = set(zip(cve_ids, feature_fps))
+        conn = self._conn()
+        now = int(time.time())
+
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (cve_id TEXT NOT NULL, feature_fp TEXT NOT NULL)")
+        conn.executemany("INSERT INTO temp.wanted (cve_id, feature_fp) VALUES (?, ?)", wanted)
+        # CROSS JOIN keeps the requested keys as the outer loop: one primary key probe per key
+        rows = conn.execute(
+            "SELECT s.cve_id, s.feature_fp, s.score, s.last_used FROM temp.wanted w "
+            "CROSS JOIN scores s ON s.model_hash = ? AND s.cve_id = w.cve_id AND s.feature_fp = w.feature_fp",
+            (model_hash,),
+        ).fetchall()
+        conn.execute("DELETE FROM temp.wanted")
+
+        found = {(cve_id, feature_fp): score for cve_id, feature_fp, score, _ in rows}
+        conn.executemany(
+            "UPDATE scores SET last_used = ? WHERE model_hash = ? AND cve_id = ? AND feature_fp = ?",
+            [(now, model_hash, cve_id, feature_fp)
+             for cve_id, feature_fp, _, last_used in rows if last_used < now - TOUCH_INTERVAL],
+        )
+        conn.executemany(
+            "UPDATE counters SET value = value + ? WHERE name = ?",
+            [(len(found), "hits"), (len(wanted) - len(found), "misses")],
+        )
+        conn.commit()
+        return found
+
+    def store(self, model_hash, cve_ids, feature_fps, scores):
+        now = int(time.time())
+        conn = self._conn()
+        # A key can only exist already if another worker stored the same pair meanwhile: same
+        # model, same features, same score, so it is kept. total_changes then counts new rows only
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO scores (model_hash, cve_id, feature_fp, score, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(model_hash, c, f, float(s), now) for c, f, s in zip(cve_ids, feature_fps, scores)],
+        )
+        inserted = conn.total_changes - before
+        conn.execute("UPDATE counters SET value = value + ? WHERE name = 'entries'", (inserted,))
+        conn.commit()
+
+        if self._counter("entries") > self.max_entries:
+            self.evict()
+
+    def _counter(self, name):
+        row = self._conn().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def evict(self):
+        conn = self._conn()
+        keep = int(self.max_entries * 0.9)
+        total = conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        if total > keep:
+            conn.execute(
+                "DELETE FROM scores WHERE rowid IN "
+                "(SELECT rowid FROM scores ORDER BY last_used LIMIT ?)",
+                (total - keep,),
+            )
+            print(f"🧹 Score cache evicted {total - keep} least recently used entries")
+        # Resynchronize the counter with the table
+        conn.execute("UPDATE counters SET value = (SELECT COUNT(*) FROM scores) WHERE name = 'entries'")
+        conn.commit()
+
+    def stats(self):
+        counters = dict(self._conn().execute("SELECT name, value FROM counters"))
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hitRate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": counters.get("entries", 0),
+            "maxEntries": self.max_entries,
+        }
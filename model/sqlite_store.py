@@ -0,0 +1,33 @@
+import os
+import sqlite3
+import threading
+
+# === SQLite-Backed Store ===
+class SQLiteStore:
+    """
+    Base class for the stores kept in a SQLite database: the job log, the
+    shared worker state and the score cache.
+
+    One connection is opened per thread, on first use, and the database runs
+    in WAL mode so threads and worker processes can read while another one
+    writes. Connections must not be shared across fork(), so preforked
+    workers call after_fork() to drop the ones inherited from the master.
+    Ref: https://www.sqlite.org/wal.html
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn().execute("PRAGMA journal_mode=WAL")
+
+    def after_fork(self):
+        """Drops connections inherited from a parent process; each child opens its own."""
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
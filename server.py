@@ -1,17 +1,33 @@
 import sys
 import os
-import pandas as pd
-import numpy as np
-from flask import Flask, request, jsonify, send_file
+import time
+import json
+import hashlib
+import threading
+from flask import Flask, request, jsonify, send_file, Response
 from werkzeug.utils import secure_filename  # Protects against directory traversal attacks
+from werkzeug.exceptions import RequestEntityTooLarge  # Raised by the body stream past MAX_CONTENT_LENGTH
 from flask_cors import CORS  # Enable Cross-Origin Resource Sharing
-import subprocess
 from datetime import datetime, timedelta
-from collections import deque, Counter  # Efficient fixed-size history tracker
+from collections import Counter, OrderedDict
 
 # Add the model directory to Python's module search path
 # Reference: https://stackoverflow.com/questions/4383571/importing-files-from-different-folder
 sys.path.insert(0, "/home/ec2-user/model")
+from engine import PredictionEngine  # In-process scoring, replaces the predict.py subprocess
+from registry import ModelRegistry, MODEL_FILES  # Warm, hot-reloading model cache
+from catalogue import CveCatalogue  # Preindexed cve_log.csv, reloaded on change
+from score_cache import ScoreCache, SCORE_CACHE_ENABLED  # Opt-in persistent (CVE, features, model) -> score cache
+from results import (  # Columnar results, written to disk block by block while scoring
+    make_cursor, read_cursor, parse_schema, SORT_KEYS, SCHEMA_PERCENT_STRING, SCHEMA_NUMERIC, DEFAULT_SCHEMA,
+    FORMATS, BINARY_FORMATS, RESULT_FORMATS, stored_path, stored_formats, stored_csv_schema, iter_stored_csv,
+    load_stored, output_pending,
+)
+from jobs import JobQueue, QueueFull  # Background prediction workers
+from uploads import open_upload_stream, UPLOAD_TEE  # Multipart body streamed into the CSV parser
+from job_log import JobLog  # Durable, indexed log of finished prediction jobs
+from state import make_state  # Active users + job status, per process or shared across workers
+from events import EventBus, TooManyStreams, EVENT_BUSY_RETRY_SECONDS  # Job progress, admin metric deltas
 
 # === Flask App Setup ===
 app = Flask(__name__)
@@ -28,17 +44,61 @@ MODEL_FOLDER = "/home/ec2-user/model"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PREDICTIONS_FOLDER, exist_ok=True)
 
+# === Prediction Engine ===
+# Loaded once per process so uploads skip interpreter startup, imports and model loading
+model_registry = ModelRegistry(MODEL_FOLDER)
+model_registry.preload()
+cve_catalogue = CveCatalogue(os.path.join(MODEL_FOLDER, "cve_log.csv"))
+if cve_catalogue.exists():
+    cve_catalogue.snapshot()  # Parse it now so preforked workers share it instead of each loading it
+score_cache = ScoreCache() if SCORE_CACHE_ENABLED else None
+engine = PredictionEngine(MODEL_FOLDER, registry=model_registry, catalogue=cve_catalogue, score_cache=score_cache)
+try:
+    engine.tune(MODEL_FILES["V1"])
+except Exception as e:
+    print(f"❌ ERROR: Batch size auto-tuning failed, using {engine.batch_size}: {str(e)}")
+
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {"csv"}  # Only accept CSV uploads
 
-# === In-Memory History Store ===
-# Using deque ensures max 10 recent jobs are stored efficiently
-# Reference: https://docs.python.org/3/library/collections.html#collections.deque
-history = deque(maxlen=10)
-
-# === In-Memory Queues and Active User Tracking ===
-prediction_queue = []
-active_users = {}  # key = IP, value = last seen timestamp
+# === Download Offload ===
+# Behind a web server, let it send stored result files so a slow client never holds a worker thread:
+#   DAIVERP_SENDFILE=x-sendfile  Apache mod_xsendfile / lighttpd (X-Sendfile with the file path)
+#   DAIVERP_SENDFILE=x-accel     nginx (X-Accel-Redirect to an internal location that maps
+#                                DAIVERP_ACCEL_PREFIX onto the predictions folder)
+# Ref: https://flask.palletsprojects.com/en/stable/config/#USE_X_SENDFILE
+# Ref: https://nginx.org/en/docs/http/ngx_http_proxy_module.html#proxy_ignore_headers
+# Only stored files can be offloaded, so with offload on every job also stores its CSV (the
+# dashboard's download link); a CSV in another ?schema= than the job's is still streamed here
+SENDFILE_MODE = os.getenv("DAIVERP_SENDFILE", "")
+ACCEL_PREFIX = os.getenv("DAIVERP_ACCEL_PREFIX", "/protected-predictions/")
+app.config["USE_X_SENDFILE"] = SENDFILE_MODE == "x-sendfile"
+JOB_RESULT_FORMATS = list(dict.fromkeys(RESULT_FORMATS + ["csv"])) if SENDFILE_MODE else RESULT_FORMATS
+DOWNLOAD_RETRY_SECONDS = 1  # Retry-After while a result file is still being written
+
+# === Results Paging ===
+RESULTS_PAGE_SIZE = int(os.getenv("DAIVERP_RESULTS_PAGE_SIZE", "500"))
+RESULTS_MAX_PAGE_SIZE = 10000
+
+# === Prediction History Store ===
+# Every finished job is appended to a SQLite (WAL) log indexed on timestamp and model,
+# so the admin charts survive restarts and cover more than the last few jobs
+# Reference: https://www.sqlite.org/wal.html
+job_log = JobLog()
+HISTORY_LIMIT = 10  # Jobs returned by /api/history
+
+# === Shared State (active users, job status) ===
+# DAIVERP_STATE_BACKEND=local keeps it in this process behind locks; =sqlite shares it
+# between worker processes so every worker reports the same admin numbers
+ACTIVE_USER_MINUTES = 15  # "Active" = seen in the last 15 minutes
+shared_state = make_state()
+event_bus = EventBus(shared_state)
+
+# Finished results held in memory for /api/results: the last few read back from their
+# stored files (by whichever worker serves the request). Older ones are reloaded when asked for
+RESULTS_CACHED = 4
+loaded_results = OrderedDict()  # job_id -> PredictionResult
+loaded_results_lock = threading.Lock()
 
 # === Utility: Validate allowed file extensions ===
 def allowed_file(filename):
@@ -49,7 +109,7 @@ def allowed_file(filename):
 def home():
     return "Server is running!"
 
-# === Route: Upload a system log and trigger prediction ===
+# === Route: Upload a system log and queue a prediction job ===
 @app.route("/upload", methods=["POST"])
 def upload_file():
     if "file" not in request.files:
@@ -60,125 +120,419 @@ def upload_file():
         return jsonify({"error": "No selected file"}), 400
 
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
+        received_at = time.time()
+        # Prefix with a unique token so concurrent uploads of the same name don't collide
+        filename = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{secure_filename(file.filename)}"
         filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
         file.save(filepath)
         print(f"📂 Uploaded File Path: {filepath}")
 
         selected_model = request.form.get("model", "V1")
         print(f"🔍 Selected model from user: {selected_model}")
-
-        # Simulate job queue
-        job_id = f"job_{datetime.now().isoformat()}"
-        prediction_queue.append(job_id)
+        try:
+            csv_schema = parse_schema(request.form.get("schema") or request.args.get("schema"))
+        except ValueError as e:
+            os.remove(filepath)
+            return jsonify({"error": str(e)}), 400
 
         # Track active user IP
-        user_ip = request.remote_addr
-        active_users[user_ip] = datetime.now()
-
-        # Run processing
-        output_filepath, output_filename = process_system_log(filepath, selected_model)
-
-        # Remove job from queue
-        if job_id in prediction_queue:
-            prediction_queue.remove(job_id)
-
-        if output_filepath:
-            output_df = pd.read_csv(output_filepath)
-            json_data = output_df.to_dict(orient="records")
-
-            # Track prediction metadata in memory
-            history.appendleft({
-                "timestamp": datetime.now().isoformat(),
-                "filename": output_filename,
-                "model": selected_model
-            })
-
-            return jsonify({
-                "message": "Processing complete",
-                "download_url": f"/download/{output_filename}",
-                "predictions": json_data
-            })
-        else:
-            return jsonify({"error": "Processing failed"}), 500
+        shared_state.touch_user(request.remote_addr)
+
+        # Hand the file to the worker pool and return straight away
+        try:
+            job = prediction_jobs.submit(
+                {"filepath": filepath, "model": selected_model, "schema": csv_schema, "received_at": received_at},
+                model=selected_model,
+                filename=file.filename,
+            )
+        except QueueFull as e:
+            os.remove(filepath)
+            return jsonify({"error": str(e)}), 429
+
+        return jsonify({
+            "message": "Upload accepted",
+            "job_id": job["id"],
+            "status_url": f"/api/jobs/{job['id']}",
+            "result_url": f"/api/results/{job['id']}"
+        }), 202
 
     return jsonify({"error": "Invalid file format"}), 400
 
-# === Helper: Process system log and trigger predict.py script ===
-def process_system_log(filepath, user_model_choice):
+# === Route: Stream an upload straight into the CSV parser ===
+# The system log is parsed and matched while the body is still arriving, then
+# scored on the worker pool like /upload. Pass the model as ?model=V1|V2 (a
+# "model" form field also works if it is sent before the file; one sent after
+# it that names a different model is rejected, since the file was already
+# read for the first one). The same goes for "schema".
+@app.route("/upload/stream", methods=["POST"])
+def upload_stream():
+    received_at = time.time()
+    # Claim a backlog slot before reading the body, so a full queue answers 429 straight away
+    try:
+        prediction_jobs.reserve()
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    reserved = True
+    upload = None
+    accepted = False
+
+    try:
+        try:
+            reader, upload = open_upload_stream(request, UPLOAD_FOLDER if UPLOAD_TEE else None)
+            filename = upload.open()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if not filename:
+            return jsonify({"error": "No file part"}), 400
+        if not allowed_file(filename):
+            return jsonify({"error": "Invalid file format"}), 400
+
+        selected_model = request.args.get("model") or upload.fields.get("model", "V1")
+        print(f"📂 Streaming Upload: {filename}, model: {selected_model}")
+        try:
+            csv_schema = parse_schema(request.args.get("schema") or upload.fields.get("schema"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            systems = engine.ingest(reader, MODEL_FILES.get(selected_model, MODEL_FILES["V1"]))
+            reader.close()
+        except RequestEntityTooLarge:
+            raise  # Flask answers 413
+        except Exception as e:
+            print(f"❌ ERROR Streaming Upload: {str(e)}")
+            return jsonify({"error": f"Could not read the system log: {str(e)}"}), 400
+
+        # Fields sent after the file are only parsed by close(); they must match what was used
+        late_model = upload.fields.get("model")
+        if not request.args.get("model") and late_model is not None and late_model != selected_model:
+            return jsonify({"error": "Send the 'model' field before the file, or pass ?model="}), 400
+        late_schema = upload.fields.get("schema")
+        if not request.args.get("schema") and late_schema is not None:
+            try:
+                late_schema = parse_schema(late_schema)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if late_schema != csv_schema:
+                return jsonify({"error": "Send the 'schema' field before the file, or pass ?schema="}), 400
+
+        rows_per_sec = round(systems["total_rows"] / systems["seconds"]) if systems["seconds"] else None
+        print(f"✅ Streamed {systems['total_rows']} rows ({upload.bytes_received} bytes) at {rows_per_sec} rows/sec")
+
+        # Track active user IP
+        shared_state.touch_user(request.remote_addr)
+
+        reserved = False  # submit() owns the slot from here, even if it fails
+        job = prediction_jobs.submit(
+            {
+                "filepath": upload.tee_path, "systems": systems, "model": selected_model,
+                "schema": csv_schema, "received_at": received_at,
+            },
+            reserved=True,
+            model=selected_model,
+            filename=filename,
+        )
+        accepted = True
+
+        return jsonify({
+            "message": "Upload accepted",
+            "job_id": job["id"],
+            "rows": systems["total_rows"],
+            "status_url": f"/api/jobs/{job['id']}",
+            "result_url": f"/api/results/{job['id']}"
+        }), 202
+    finally:
+        if reserved:
+            prediction_jobs.release()
+        if upload is not None and not accepted:
+            upload.discard()  # Don't leave the tee copy or its handle behind
+
+# === Helper: Run one queued prediction job (called on a worker thread) ===
+def run_prediction_job(job_id, payload, report):
+    # Note when the first scored rows were written, for time-to-first-result
+    first_result = {}
+
+    def track(stage, done=0, total=0):
+        if "at" not in first_result and (stage == "writing" or (stage == "scoring" and done)):
+            first_result["at"] = time.time()
+        report(stage, done, total)
+
+    output_filepath, output_filename, predictions = process_system_log(
+        payload["filepath"], payload["model"], job_id=job_id, progress=track,
+        systems=payload.get("systems"), schema=payload["schema"],
+    )
+    if not output_filepath:
+        raise RuntimeError("Processing failed")
+
+    received_at = payload["received_at"]
+    ingest_seconds = predictions.attrs.get("ingest_seconds") or 0
+    timing = {
+        "uploadRows": predictions.attrs.get("system_rows"),
+        "uploadRowsPerSec": round(predictions.attrs.get("system_rows", 0) / ingest_seconds) if ingest_seconds else None,
+        "timeToFirstResultMs": round((first_result.get("at", time.time()) - received_at) * 1000),
+        "totalSeconds": round(time.time() - received_at, 3),
+    }
+    print(f"⏱️ Job {job_id} timing: {timing}")
+
+    # Record the finished job in the durable job log
+    try:
+        job_log.append(payload["model"], output_filename, job_id=job_id, rows=len(predictions))
+    except Exception as e:
+        print(f"❌ ERROR: Could not record job {job_id} in the job log: {str(e)}")
+
+    return {
+        "rows": len(predictions),
+        "filename": output_filename,
+        "download_url": f"/download/{output_filename}",
+        "schema": payload["schema"],  # Schema version of the download CSV
+        "timing": timing,
+    }
+
+# === Helper: Push job changes (and the metrics they move) to event streams ===
+def publish_job_event(job):
+    event_bus.publish("job", job, key=job["id"])
+    if job["stage"] in ("queued", "starting", "done", "failed"):
+        publish_metrics()  # Queue length / daily predictions changed
+
+prediction_jobs = JobQueue(run_prediction_job, state=shared_state, on_change=publish_job_event)
+
+# === Helper: Process system log with the in-process prediction engine ===
+def process_system_log(filepath, user_model_choice, job_id=None, progress=None, systems=None,
+                       schema=SCHEMA_PERCENT_STRING):
     try:
         print(f"📂 Checking System Log File: {filepath}")
-        if not os.path.exists(filepath):
+        # Streamed uploads arrive already ingested and may have no file on disk
+        if systems is None and not os.path.exists(filepath):
             print("❌ ERROR: System log file not found!")
-            return None, None
-
-        system_log = pd.read_csv(filepath)
-        print(f"✅ System Log Loaded: {filepath}, Rows: {len(system_log)}")
+            return None, None, None
 
-        cve_log_path = os.path.join(MODEL_FOLDER, "cve_log.csv")
-        print(f"📂 Checking CVE Log File: {cve_log_path}")
-        if not os.path.exists(cve_log_path):
+        print(f"📂 Checking CVE Log File: {cve_catalogue.path}")
+        if not cve_catalogue.exists():
             print("❌ ERROR: CVE log file not found!")
-            return None, None
+            return None, None, None
 
-        model_filename = (
-            "daiverp_rf_model_V2.pkl" if user_model_choice == "V2"
-            else "daiverp_rf_model_V1.pkl"
-        )
+        model_filename = MODEL_FILES.get(user_model_choice, MODEL_FILES["V1"])
 
         # Create timestamped filename to avoid overwriting
         # Reference: https://stackoverflow.com/questions/10607688/how-to-create-a-file-name-with-the-current-date-time-in-python
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        output_filename = f"predictions_{timestamp}.csv"
+        suffix = f"_{job_id}" if job_id else ""
+        output_filename = f"predictions_{timestamp}{suffix}.csv"
         prediction_output = os.path.join(PREDICTIONS_FOLDER, output_filename)
 
-        # Run the prediction script with required args
-        # Reference: https://stackoverflow.com/questions/89228/how-to-call-external-command-in-python
-        cmd = f"python3 {MODEL_FOLDER}/predict.py {filepath} {cve_log_path} {model_filename} {prediction_output}"
-        print(f"🚀 Running Prediction Script: {cmd}")
-
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        print(f"🔍 Prediction Script Output:\n{result.stdout}")
-
-        if result.returncode != 0:
-            print(f"❌ ERROR: Prediction script failed!\n{result.stderr}")
-            return None, None
-
-        if not os.path.exists(prediction_output):
-            print("❌ ERROR: Prediction output file not created!")
-            return None, None
+        print(f"🚀 Running Prediction Engine: {model_filename} on {filepath}")
+        # Scored blocks go straight to disk; the files are complete when this returns, so the
+        # job is only reported done (to any worker process) once its result is readable
+        predictions = engine.match_and_predict(
+            filepath, model_filename, prediction_output, progress, systems=systems, schema=schema,
+            formats=JOB_RESULT_FORMATS,
+        )
 
-        print(f"✅ Predictions Saved: {prediction_output}")
-        return prediction_output, output_filename
+        # The engine streams the upload, so row counts come back with the predictions
+        print(f"✅ Predictions Ready: {prediction_output}, System Log Rows: {predictions.attrs.get('system_rows')}")
+        return prediction_output, output_filename, predictions
 
     except Exception as e:
         print(f"❌ ERROR Processing File: {str(e)}")
-        return None, None
+        return None, None, None
+
+# === Route: List recent prediction jobs ===
+@app.route("/api/jobs", methods=["GET"])
+def list_jobs():
+    return jsonify(prediction_jobs.list()), 200
+
+# === Route: Poll the state and progress of one prediction job ===
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = prediction_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    # Pollers that send back the ETag get an empty 304 until the job moves on
+    response = jsonify(job)
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+# === Helpers: Bounded cache of finished results ===
+def remember_result(job_id, result):
+    with loaded_results_lock:
+        loaded_results[job_id] = result
+        loaded_results.move_to_end(job_id)
+        while len(loaded_results) > RESULTS_CACHED:
+            loaded_results.popitem(last=False)
+
+def job_result(job):
+    """The job's PredictionResult, from the cache or its stored files (None if not readable yet)."""
+    with loaded_results_lock:
+        if job["id"] in loaded_results:
+            loaded_results.move_to_end(job["id"])
+            return loaded_results[job["id"]]
+
+    result = load_stored(os.path.join(PREDICTIONS_FOLDER, job["result"]["filename"]))
+    if result is not None:
+        remember_result(job["id"], result)
+    return result
+
+# === Route: Prediction rows of a finished job ===
+@app.route("/api/results/<job_id>", methods=["GET"])
+def get_job_results(job_id):
+    """
+    Pages through a finished job's predictions.
+
+    ?product= and ?system_id= filter on exact values, ?q= searches CVE_ID and
+    System_ID, ?sort=risk|CVE_ID|System_ID|Product with ?order=desc|asc sorts
+    server-side. ?limit= rows are returned per page; pass the response's
+    next_cursor as ?cursor= for the next one. ?format=ndjson (or an
+    Accept: application/x-ndjson header) streams every remaining row as
+    newline-delimited JSON instead. ?schema=2 returns DAIVERP_Risk_Score as
+    a 0-1 number; the default (schema 1) keeps the "73.41%" strings.
+    """
+    job = prediction_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["state"] != "done":
+        return jsonify({"error": f"Job is {job['state']}", "state": job["state"]}), 409
+
+    result = job_result(job)
+    if result is None:
+        # Ran on another worker process and none of its files is readable (yet)
+        response = jsonify({
+            "error": "Result is not available on this worker yet",
+            "download_url": job["result"].get("download_url"),
+        })
+        response.status_code = 409
+        response.headers["Retry-After"] = str(DOWNLOAD_RETRY_SECONDS)
+        return response
+    product = request.args.get("product") or None
+    system_id = request.args.get("system_id") or None
+    search = request.args.get("q") or None
+    sort = request.args.get("sort") or None
+    order = "asc" if request.args.get("order", "desc").lower() == "asc" else "desc"
+    if sort and sort not in SORT_KEYS:
+        return jsonify({"error": f"Unknown sort key: {sort}"}), 400
+
+    query = (product, system_id, search, sort, order)
+    try:
+        # Old clients send no schema and keep getting percent strings
+        schema = parse_schema(request.args.get("schema"), SCHEMA_PERCENT_STRING)
+        offset = read_cursor(request.args.get("cursor"), query)
+        limit = int(request.args.get("limit", RESULTS_PAGE_SIZE))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = max(1, min(limit, RESULTS_MAX_PAGE_SIZE))
+
+    rows = result.select(product, system_id, search, sort, order)
+    wants_ndjson = (
+        request.args.get("format") == "ndjson"
+        or request.accept_mimetypes.best == "application/x-ndjson"
+    )
+    if wants_ndjson:
+        # Generator response: rows are encoded chunk by chunk as the client reads
+        # Ref: https://flask.palletsprojects.com/en/stable/patterns/streaming/
+        response = Response(result.iter_ndjson(rows[offset:], schema), mimetype="application/x-ndjson")
+        response.headers["X-Total-Count"] = str(len(rows))
+        response.headers["X-Schema-Version"] = str(schema)
+        return response
+
+    page = rows[offset: offset + limit]
+    next_offset = offset + len(page)
+    body = result.to_json(
+        page,
+        schema,
+        message="Processing complete",
+        download_url=job["result"]["download_url"],
+        result_url=f"/api/results/{job_id}",
+        total=len(rows),
+        limit=limit,
+        next_cursor=make_cursor(next_offset, query) if next_offset < len(rows) else None,
+        products=result.product_names(),
+        severity=result.severity_counts(rows),
+    )
+    return Response(body, mimetype="application/json")
 
 # === Route: Download predictions by filename ===
 @app.route("/download/<filename>", methods=["GET"])
 def download_file(filename):
+    """
+    Sends a stored prediction result in the negotiated format: ?format=
+    csv|parquet|arrow, else the Accept header, else the filename's extension.
+    Stored files are sent as they are, through the web server when
+    DAIVERP_SENDFILE is set; a CSV requested for a result kept only as
+    Parquet / Arrow is generated on the fly and streamed by this thread
+    (?schema= picks its score format). X-Schema-Version names the schema of
+    whatever is sent.
+    """
     file_path = os.path.join(PREDICTIONS_FOLDER, filename)
     print(f"📂 Checking file at path: {file_path}")
 
+    # An explicit Accept type (not */*) overrides the extension
+    extension = os.path.splitext(filename)[1].lstrip(".").lower()
+    accepted = next((fmt for fmt, (_, mime) in FORMATS.items() if mime == request.accept_mimetypes.best), None)
+    requested = request.args.get("format") or accepted or (extension if extension in FORMATS else "csv")
+    if requested not in FORMATS:
+        return jsonify({"error": f"Unknown format: {requested}"}), 400
+
+    try:
+        schema = parse_schema(request.args.get("schema"), None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stored = stored_formats(file_path)
+    binary = next((fmt for fmt in BINARY_FORMATS if fmt in stored), None)
+    if ("csv" in stored and schema is not None and binary
+            and stored_csv_schema(stored_path(file_path, "csv")) not in (None, schema)):
+        stored.remove("csv")  # Stored in the job's schema; build the other one from the binary file
+    download_name = os.path.basename(stored_path(filename, requested))
+
     # Reference: https://flask.palletsprojects.com/en/2.2.x/api/#flask.send_file
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True, mimetype="text/csv")
-    else:
-        print("❌ ERROR: File not found!")
-        return jsonify({"error": "File not found"}), 404
+    if requested in stored:
+        stored_file = stored_path(file_path, requested)
+        if SENDFILE_MODE == "x-accel":
+            # nginx streams the file itself; this thread is free as soon as the headers are sent
+            response = Response(mimetype=FORMATS[requested][1])
+            response.headers["X-Accel-Redirect"] = ACCEL_PREFIX + os.path.basename(stored_file)
+            response.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+        else:
+            response = send_file(
+                stored_file, as_attachment=True, mimetype=FORMATS[requested][1], download_name=download_name,
+            )
+        # Binary files always hold numeric scores; a stored CSV is in its job's schema
+        if requested == "csv":
+            served_schema = stored_csv_schema(stored_file) or schema or DEFAULT_SCHEMA
+        else:
+            served_schema = SCHEMA_NUMERIC
+        response.headers["X-Schema-Version"] = str(served_schema)
+        return response
+
+    if requested == "csv" and binary:
+        # Generator response: the CSV is built one record batch at a time
+        schema = schema or DEFAULT_SCHEMA
+        csv_stream = iter_stored_csv(stored_path(file_path, binary), binary, schema)
+        response = Response(csv_stream, mimetype="text/csv")
+        response.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+        response.headers["X-Schema-Version"] = str(schema)
+        return response
+
+    if output_pending(file_path):
+        # The job's files are still being written: ask the client to come back rather
+        # than parking this thread until the writer finishes
+        response = jsonify({"status": "writing", "message": "Result file is still being written"})
+        response.status_code = 202
+        response.headers["Retry-After"] = str(DOWNLOAD_RETRY_SECONDS)
+        return response
+
+    print("❌ ERROR: File not found!")
+    return jsonify({"error": "File not found"}), 404
 
 # === Route: Get product list from CVE log ===
 @app.route("/api/products", methods=["GET"])
 def get_products():
     try:
-        cve_log_path = os.path.join(MODEL_FOLDER, "cve_log.csv")
-        if not os.path.exists(cve_log_path):
+        if not cve_catalogue.exists():
             return jsonify({"error": "CVE log file not found"}), 500
 
-        cve_log = pd.read_csv(cve_log_path)
-        unique_products = cve_log["Product"].dropna().unique().tolist()
-        return jsonify(unique_products)
+        return jsonify(cve_catalogue.products())
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -186,32 +540,55 @@ def get_products():
 # === Route: Get recent prediction history ===
 @app.route("/api/history", methods=["GET"])
 def get_history():
-    return jsonify(list(history)), 200
+    return jsonify(job_log.recent(HISTORY_LIMIT)), 200
 
 # === Route: Admin metrics ===
 @app.route("/api/admin/metrics", methods=["GET"])
 def get_admin_metrics():
+    return jsonify(admin_metrics())
+
+def admin_metrics():
     now = datetime.now()
     cutoff = now - timedelta(days=1)
 
-    # Filter predictions in last 24h
-    daily_predictions = sum(
-        1 for record in history
-        if "timestamp" in record and datetime.fromisoformat(record["timestamp"]) > cutoff
-    )
+    # Count predictions in last 24h (hourly rollups + the partial first hour)
+    daily_predictions = job_log.count_since(cutoff)
 
-    # Filter active users within last 15 minutes
-    active_cutoff = now - timedelta(minutes=15)
-    recent_users = [ip for ip, ts in active_users.items() if ts > active_cutoff]
+    # Distinct users seen within the last 15 minutes, O(buckets)
+    recent_users = shared_state.active_users(ACTIVE_USER_MINUTES)
 
     model_deployed = os.getenv("MODEL_DEPLOYED", "2025-03-30")
 
-    return jsonify({
-        "activeUsers": len(recent_users),
-        "queueLength": len(prediction_queue),
+    # Tuning is per process: report every worker's, labelled by pid, and headline the
+    # lowest pid's so the numbers don't depend on which worker answers
+    if registered_worker != os.getpid():
+        register_worker()
+    workers = shared_state.workers()  # Includes this process, ordered by pid
+    first = workers[0]
+
+    return {
+        "activeUsers": recent_users,
+        "queueLength": prediction_jobs.backlog(),
         "dailyPredictions": daily_predictions,
-        "modelDeployed": model_deployed
-    })
+        "modelDeployed": model_deployed,
+        "scoreCache": score_cache.stats() if score_cache else None,  # Counted in the cache's database, across workers
+        "batchSize": first["batchSize"],
+        "batchRowsPerSec": first["batchRowsPerSec"],
+        "workers": {
+            str(worker["pid"]): {"batchSize": worker["batchSize"], "batchRowsPerSec": worker["batchRowsPerSec"]}
+            for worker in workers
+        },
+    }
+
+# === Helper: Record this process's tuning in the shared state ===
+registered_worker = None  # pid that last registered; differs in a freshly forked worker
+
+def register_worker():
+    global registered_worker
+    registered_worker = os.getpid()
+    # JSON object keys are strings; use them in every backend so values compare equal
+    rates = {str(size): rate for size, rate in engine.batch_rates.items()}
+    shared_state.publish_worker(registered_worker, {"batchSize": engine.batch_size, "batchRowsPerSec": rates})
 
 # === Route: Predictions chart data (with daily, weekly, monthly, all) ===
 @app.route("/api/admin/weekly-predictions", methods=["GET"])
@@ -224,12 +601,16 @@ def get_weekly_predictions():
     'monthly' => last 30 days, group by day (e.g. 'Apr 09')
     """
     range_param = request.args.get("range", "weekly").lower().strip()
+    return jsonify(prediction_volume(range_param))
+
+def prediction_volume(range_param):
     now_time = datetime.now()
 
     # Decide time cutoff and labeling
     if range_param == "daily":
         # last 24 hours, label each hour
         cutoff = now_time - timedelta(days=1)
+        bucket = "hour"
         label_order = []
         for i in range(24):
             hour_label = (now_time - timedelta(hours=(23 - i))).strftime("%H:00")
@@ -241,6 +622,7 @@ def get_weekly_predictions():
     elif range_param == "monthly":
         # last 30 days, label by 'Apr 09'
         cutoff = now_time - timedelta(days=30)
+        bucket = "day"
         label_order = []
         for i in reversed(range(30)):
             label_str = (now_time - timedelta(days=i)).strftime("%b %d")
@@ -252,6 +634,7 @@ def get_weekly_predictions():
     elif range_param == "all":
         # no cutoff, group by day of week
         cutoff = None
+        bucket = "day"
         label_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
         def get_label(dt):
@@ -260,6 +643,7 @@ def get_weekly_predictions():
     else:
         # weekly by default
         cutoff = now_time - timedelta(days=7)
+        bucket = "day"
         label_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
         def get_label(dt):
@@ -268,29 +652,25 @@ def get_weekly_predictions():
     counter_v1 = Counter()
     counter_v2 = Counter()
 
-    for record in history:
-        if "timestamp" in record and "model" in record:
-            dt = datetime.fromisoformat(record["timestamp"])
-            if cutoff and dt < cutoff:
-                continue
+    # Pre-aggregated per hour/day and model: O(buckets), the partial bucket at the cutoff is left out
+    for dt, model, count in job_log.counts(since=cutoff, bucket=bucket):
+        label = get_label(dt)
+        if label not in label_order:
+            continue
 
-            label = get_label(dt)
-            if label not in label_order:
-                continue
-
-            if record["model"] == "V2":
-                counter_v2[label] += 1
-            else:
-                counter_v1[label] += 1
+        if model == "V2":
+            counter_v2[label] += count
+        else:
+            counter_v1[label] += count
 
     data_v1 = [counter_v1.get(lbl, 0) for lbl in label_order]
     data_v2 = [counter_v2.get(lbl, 0) for lbl in label_order]
 
-    return jsonify({
+    return {
         "labels": label_order,
         "v1": data_v1,
         "v2": data_v2
-    })
+    }
 
 @app.route("/api/admin/hourly-predictions", methods=["GET"])
 def get_hourly_predictions():
@@ -298,57 +678,52 @@ def get_hourly_predictions():
     Returns how many predictions happened each hour in the last 24 hours.
     Grouped by hour in format 'HH:00'
     """
+    return jsonify(hourly_predictions())
+
+def hourly_predictions():
     now = datetime.now()
     cutoff = now - timedelta(hours=24)
     counter_v1 = Counter()
     counter_v2 = Counter()
 
-    for record in history:
-        if "timestamp" in record and "model" in record:
-            dt = datetime.fromisoformat(record["timestamp"])
-            if dt < cutoff:
-                continue
-
-            label = dt.strftime("%H:00")
-            if record["model"] == "V2":
-                counter_v2[label] += 1
-            else:
-                counter_v1[label] += 1
+    for dt, model, count in job_log.counts(since=cutoff, bucket="hour"):
+        label = dt.strftime("%H:00")
+        if model == "V2":
+            counter_v2[label] += count
+        else:
+            counter_v1[label] += count
 
     # Create labels for the past 24 hours (in correct order)
     labels = [(now - timedelta(hours=i)).strftime("%H:00") for i in reversed(range(24))]
     data_v1 = [counter_v1.get(lab, 0) for lab in labels]
     data_v2 = [counter_v2.get(lab, 0) for lab in labels]
 
-    return jsonify({
+    return {
         "labels": labels,
         "v1": data_v1,
         "v2": data_v2
-    })
+    }
 
 
 # === Route: Track active users who are visiting (not just uploading) ===
 @app.route("/api/ping", methods=["GET"])
 def track_active_user():
-    user_ip = request.remote_addr
-    active_users[user_ip] = datetime.now()
+    shared_state.touch_user(request.remote_addr)
     return jsonify({"message": "pong", "timestamp": datetime.now().isoformat()})
 
 # === Route: Model usage pie chart ===
 @app.route("/api/admin/model-usage", methods=["GET"])
 def get_model_usage():
     """
-    Returns how many times V1 vs V2 have been used across all predictions in history.
+    Returns how many times V1 vs V2 have been used across all predictions in the job log.
     """
-    v1_count = 0
-    v2_count = 0
-    for record in history:
-        if "model" in record:
-            if record["model"] == "V2":
-                v2_count += 1
-            else:
-                v1_count += 1
-    return jsonify({"v1Count": v1_count, "v2Count": v2_count})
+    return jsonify(model_usage())
+
+def model_usage():
+    usage = job_log.model_counts()
+    v2_count = usage.pop("V2", 0)
+    v1_count = sum(usage.values())
+    return {"v1Count": v1_count, "v2Count": v2_count}
 
 # === Route: Daily totals bar chart (last 14 days) ===
 @app.route("/api/admin/daily-totals", methods=["GET"])
@@ -357,16 +732,16 @@ def get_daily_totals():
     Returns how many predictions happened on each of the last 14 days.
     The response includes 'labels' (day strings) and 'data' (counts).
     """
+    return jsonify(daily_totals())
+
+def daily_totals():
     now = datetime.utcnow()
     cutoff = now - timedelta(days=14)
     daily_counter = Counter()
 
-    for record in history:
-        if "timestamp" in record:
-            dt = datetime.fromisoformat(record["timestamp"])
-            if dt >= cutoff:
-                day_label = dt.strftime("%b %d")  # e.g. 'Apr 12'
-                daily_counter[day_label] += 1
+    for dt, _, count in job_log.counts(since=cutoff, bucket="day"):
+        day_label = dt.strftime("%b %d")  # e.g. 'Apr 12'
+        daily_counter[day_label] += count
 
     # Build labels for the last 14 days in chronological order
     labels = []
@@ -376,15 +751,154 @@ def get_daily_totals():
 
     data = [daily_counter.get(day, 0) for day in labels]
 
-    return jsonify({
+    return {
         "labels": labels,
         "data": data
-    })
+    }
 
+# === Route: Combined admin dashboard (one poll, ETag / 304) ===
+# Chart series only change when a job is logged or the clock moves to the next hour,
+# so they are computed once per (range, last job id, hour) and reused between polls
+# Ref: https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/ETag
+DASHBOARD_RANGES = ("daily", "weekly", "monthly", "all")
+dashboard_cache = {}  # range -> (epoch, series); one entry per DASHBOARD_RANGES value at most
+
+@app.route("/api/admin/dashboard", methods=["GET"])
+def get_admin_dashboard():
+    """
+    Returns metrics and every admin chart series for ?range=... in one payload.
+    Polls sending the previous ETag in If-None-Match get 304 with no body
+    while nothing has changed.
+    """
+    range_param = request.args.get("range", "weekly").lower().strip()
+    if range_param not in DASHBOARD_RANGES:
+        # Checked before caching, so arbitrary ?range= values can't grow the cache
+        return jsonify({"error": f"Unknown range: {range_param}", "ranges": list(DASHBOARD_RANGES)}), 400
+    now = datetime.now()
+    epoch = (job_log.last_id(), now.strftime("%Y%m%d%H"), datetime.utcnow().strftime("%Y%m%d%H"))
+
+    cached = dashboard_cache.get(range_param)
+    if cached and cached[0] == epoch:
+        series = cached[1]
+    else:
+        series = {
+            "predictions": prediction_volume(range_param),
+            "hourly": hourly_predictions(),
+            "modelUsage": model_usage(),
+            "dailyTotals": daily_totals(),
+        }
+        dashboard_cache[range_param] = (epoch, series)
+
+    # Metrics are live counters (queue, active users, cache stats), cheap to read each poll
+    payload = dict(series, range=range_param, metrics=admin_metrics())
+    body = json.dumps(payload, sort_keys=True)
+
+    response = Response(body, mimetype="application/json")
+    response.set_etag(hashlib.sha1(body.encode("utf-8")).hexdigest())
+    response.headers["Cache-Control"] = "no-cache"  # Always revalidate, never serve stale counts
+    return response.make_conditional(request)
+
+
+# === Route: Server-sent event stream (job progress, admin metrics) ===
+# Metrics are computed once per change (or per tick) and pushed to every client as a delta
+# of the fields that changed, instead of each client polling and recomputing them
+# Ref: https://developer.mozilla.org/en-US/docs/Web/API/Server-sent_events/Using_server-sent_events
+METRICS_PUSH_SECONDS = 5  # Picks up changes jobs don't announce (active users, cache stats)
+last_metrics = {}
+metrics_lock = threading.Lock()
+metrics_ticker = None
+
+def publish_metrics():
+    metrics = admin_metrics()
+    with metrics_lock:
+        delta = {key: value for key, value in metrics.items() if last_metrics.get(key) != value}
+        if not delta:
+            return
+        last_metrics.update(delta)
+    event_bus.publish("metrics", delta)
+
+def start_metrics_ticker():
+    # Started by the first event stream, inside the worker process serving it
+    global metrics_ticker
+    with metrics_lock:
+        if metrics_ticker is not None:
+            return
+
+        def tick():
+            while True:
+                time.sleep(METRICS_PUSH_SECONDS)
+                try:
+                    publish_metrics()
+                except Exception as e:
+                    print(f"❌ ERROR: Publishing metrics failed: {str(e)}")
+
+        metrics_ticker = threading.Thread(target=tick, name="metrics-ticker", daemon=True)
+        metrics_ticker.start()
+
+@app.route("/api/events", methods=["GET"])
+def stream_events():
+    """
+    text/event-stream of "job" events (the public job, on every state or
+    progress change) and "metrics" events (admin counters that changed).
+    ?types=job,metrics limits the event types; ?job=<id> limits job events
+    to one job and starts with its current snapshot. Reconnecting clients
+    send Last-Event-ID and get the events they missed.
+    """
+    kinds = set(filter(None, request.args.get("types", "").split(","))) or None
+    job_id = request.args.get("job") or None
+    try:
+        last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid Last-Event-ID"}), 400
+
+    snapshot = None
+    if job_id and last_event_id is None:
+        # Mark the position first: changes made while reading the snapshot are replayed after it
+        last_event_id = shared_state.latest_event_id()
+        snapshot = prediction_jobs.get(job_id)
+        if snapshot is None:
+            return jsonify({"error": "Job not found"}), 404
+
+    head = [f"event: job\ndata: {json.dumps(snapshot)}\n\n"] if snapshot is not None else []
+    try:
+        body = event_bus.open_stream(last_event_id, kinds, job_id, head)
+    except TooManyStreams:
+        # Every stream holds a server thread; past the cap, turn the client away rather than
+        # starving uploads and API calls. EventSource gives up on a 503, the UI falls back to polling
+        response = Response(f"retry: {EVENT_BUSY_RETRY_SECONDS * 1000}\n\n", status=503, mimetype="text/event-stream")
+        response.headers["Retry-After"] = str(EVENT_BUSY_RETRY_SECONDS)
+        return response
+
+    start_metrics_ticker()
+    response = Response(body, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx: pass events through unbuffered
+    return response
+
+# === Worker Process Hooks ===
+# Called by gunicorn.conf.py in each worker right after it is forked from the preloaded app
+def after_fork():
+    # SQLite connections must not be shared across fork; drop the inherited ones
+    if score_cache:
+        score_cache.after_fork()
+    job_log.after_fork()
+    shared_state.after_fork()
+    register_worker()
+
+# Called by gunicorn.conf.py in the master after it has reaped a worker process
+def worker_exited(pid):
+    # Its queued/running jobs will never finish: fail them so pollers and queueLength move on
+    for job in shared_state.reap_orphans(pid):
+        event_bus.publish("job", job, key=job["id"])
 
 # === HTTPS Launch (with self-signed certs during development) ===
+# Production: gunicorn -c gunicorn.conf.py server:app (preloaded, multi-worker, same certs)
 # Reference: https://flask.palletsprojects.com/en/2.2.x/cli/#development-server
 if __name__ == "__main__":
     context = ('/home/ec2-user/cert.pem', '/home/ec2-user/key.pem')
-    app.run(host="0.0.0.0", port=8080, ssl_context=context, debug=True)
+    # Threaded so a slow upload does not stall dashboard polls; the reloader (DAIVERP_DEBUG=1)
+    # imports the app twice, loading every model twice
+    app.run(host="0.0.0.0", port=8080, ssl_context=context, threaded=True,
+            debug=os.getenv("DAIVERP_DEBUG", "0") == "1")
 
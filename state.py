@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+from active_users import ActiveUserTracker, ACTIVE_WINDOW_MINUTES
+from sqlite_store import SQLiteStore  # model/, on the path set up by server.py
+
+# === Shared State Configuration ===
+# "local": this process only (one worker); "sqlite": shared by every worker process on the host
+STATE_BACKEND = os.getenv("DAIVERP_STATE_BACKEND", "local")
+STATE_DB_PATH = os.getenv("DAIVERP_STATE_DB", "/home/ec2-user/db/state.sqlite")
+
+EVENT_REPLAY = int(os.getenv("DAIVERP_EVENT_REPLAY", "1000"))  # Events kept for reconnecting clients
+EVENT_POLL_SECONDS = 0.5  # How often the SQLite backend checks for writes from other processes
+
+ACTIVE_JOB_STATES = ("queued", "running")
+
+# === Helper: Check whether a process is still running ===
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)  # Signal 0 only checks that the process exists
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by another user
+    return True
+
+# === In-Process State ===
+class LocalState:
+    """
+    Active users, public job snapshots and recent events held in this
+    process, behind locks. Correct for a single server process (any number of
+    threads); with several worker processes each one only sees its own.
+    """
+
+    def __init__(self):
+        self.users = ActiveUserTracker()
+        self._jobs = OrderedDict()  # job_id -> public job dict, in submission order
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=EVENT_REPLAY)  # (id, kind, key, data_json)
+        self._event_id = 0
+        self._new_event = threading.Condition()
+        self._workers = {}  # pid -> worker info
+
+    def after_fork(self):
+        pass  # Nothing inherited to reset; each process keeps its own state
+
+    def reap_orphans(self, pid=None):
+        return []  # Jobs live and die with the process that runs them
+
+    def touch_user(self, ip):
+        self.users.touch(ip)
+
+    def active_users(self, minutes):
+        return self.users.active(minutes)
+
+    def publish_job(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = job
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def backlog(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["state"] in ACTIVE_JOB_STATES)
+
+    def prune_jobs(self, retention):
+        with self._lock:
+            finished = [jid for jid, job in self._jobs.items() if job["state"] not in ACTIVE_JOB_STATES]
+            for jid in finished[:max(0, len(finished) - retention)]:
+                del self._jobs[jid]
+
+    def publish_worker(self, pid, info):
+        with self._lock:
+            self._workers[pid] = dict(info, pid=pid)
+
+    def workers(self):
+        with self._lock:
+            return [self._workers[pid] for pid in sorted(self._workers)]
+
+    def append_event(self, kind, key, data):
+        with self._new_event:
+            self._event_id += 1
+            self._events.append((self._event_id, kind, key, data))
+            self._new_event.notify_all()
+            return self._event_id
+
+    def latest_event_id(self):
+        with self._new_event:
+            return self._event_id
+
+    def events_after(self, last_id, limit=EVENT_REPLAY):
+        with self._new_event:
+            return [event for event in self._events if event[0] > last_id][:limit]
+
+    def wait_for_event(self, last_id, timeout):
+        with self._new_event:
+            self._new_event.wait_for(lambda: self._event_id > last_id, timeout)
+
+# === Cross-Process State (SQLite) ===
+class SQLiteState(SQLiteStore):
+    """
+    Same interface as LocalState, stored in a SQLite database that every
+    worker process on the host opens, so job polling, the queue length
+    and active-user counts agree whichever worker serves the request.
+
+    Users are kept as ip -> last-seen minute, indexed on the minute; a local
+    ActiveUserTracker filters repeat pings so each IP costs at most one write
+    per minute per process. Jobs are stored as JSON snapshots with the pid of
+    the process running them; queued/running jobs whose process has exited
+    are marked failed on startup and whenever gunicorn reaps a worker (see
+    gunicorn.conf.py), so a dead worker does not leave a phantom backlog.
+    Events go into a table trimmed to the last EVENT_REPLAY rows. Each
+    process's event relay (see events.py) checks every EVENT_POLL_SECONDS
+    whether the database changed and only then reads new events.
+    Per-process figures (e.g. the tuned batch size) are stored per pid, and
+    rows of processes that have exited are dropped when they are listed.
+    """
+
+    def __init__(self, path=STATE_DB_PATH, window=ACTIVE_WINDOW_MINUTES):
+        super().__init__(path)
+        self.window = window
+        self.users = ActiveUserTracker(window)
+        self._pruned_minute = None
+
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS active_users (ip TEXT PRIMARY KEY, minute INTEGER NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS active_users_minute ON active_users (minute)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                pid INTEGER,
+                data TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+        conn.execute("CREATE TABLE IF NOT EXISTS workers (pid INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                key TEXT,
+                data TEXT NOT NULL
+            )
+        """)
+        conn.commit()
+        self.reap_orphans()
+
+    def reap_orphans(self, pid=None):
+        """
+        Marks queued/running jobs whose process has exited as failed (only
+        those run by `pid` when given). Returns the updated job snapshots.
+        """
+        conn = self._conn()
+        query = "SELECT id, pid, data FROM jobs WHERE state IN (?, ?)"
+        params = ACTIVE_JOB_STATES
+        if pid is not None:
+            query += " AND pid = ?"
+            params += (pid,)
+        reaped = []
+        for job_id, job_pid, data in conn.execute(query, params).fetchall():
+            if process_exists(job_pid):
+                continue
+            job = json.loads(data)
+            job.update(state="failed", stage="failed", error="Worker process exited")
+            conn.execute(
+                "UPDATE jobs SET state = ?, data = ? WHERE id = ?", ("failed", json.dumps(job), job_id)
+            )
+            reaped.append(job)
+            print(f"🧹 Marked orphaned job {job_id} as failed (worker pid {job_pid} is gone)")
+        conn.commit()
+        return reaped
+
+    def touch_user(self, ip):
+        minute = int(time.time() // 60)
+        if not self.users.touch(ip):
+            return  # Already recorded this minute by this process
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO active_users (ip, minute) VALUES (?, ?) "
+            "ON CONFLICT (ip) DO UPDATE SET minute = excluded.minute",
+            (ip, minute),
+        )
+        if self._pruned_minute != minute:
+            self._pruned_minute = minute
+            conn.execute("DELETE FROM active_users WHERE minute <= ?", (minute - self.window,))
+        conn.commit()
+
+    def active_users(self, minutes):
+        minute = int(time.time() // 60)
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM active_users WHERE minute > ?", (minute - min(minutes, self.window),)
+        ).fetchone()[0]
+
+    def publish_job(self, job):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO jobs (id, state, pid, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET state = excluded.state, pid = excluded.pid, data = excluded.data",
+            (job["id"], job["state"], os.getpid(), json.dumps(job)),
+        )
+        conn.commit()
+
+    def get_job(self, job_id):
+        row = self._conn().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_jobs(self):
+        rows = self._conn().execute("SELECT data FROM jobs ORDER BY rowid DESC")
+        return [json.loads(data) for data, in rows]
+
+    def backlog(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)", ACTIVE_JOB_STATES
+        ).fetchone()[0]
+
+    def prune_jobs(self, retention):
+        conn = self._conn()
+        conn.execute(
+            "DELETE FROM jobs WHERE state NOT IN (?, ?) AND rowid NOT IN "
+            "(SELECT rowid FROM jobs WHERE state NOT IN (?, ?) ORDER BY rowid DESC LIMIT ?)",
+            ACTIVE_JOB_STATES + ACTIVE_JOB_STATES + (retention,),
+        )
+        conn.commit()
+
+    def publish_worker(self, pid, info):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO workers (pid, data) VALUES (?, ?) ON CONFLICT (pid) DO UPDATE SET data = excluded.data",
+            (pid, json.dumps(dict(info, pid=pid))),
+        )
+        conn.commit()
+
+    def workers(self):
+        conn = self._conn()
+        workers, gone = [], []
+        for pid, data in conn.execute("SELECT pid, data FROM workers ORDER BY pid").fetchall():
+            if process_exists(pid):
+                workers.append(json.loads(data))
+            else:
+                gone.append((pid,))
+        if gone:
+            conn.executemany("DELETE FROM workers WHERE pid = ?", gone)
+            conn.commit()
+        return workers
+
+    def append_event(self, kind, key, data):
+        conn = self._conn()
+        event_id = conn.execute(
+            "INSERT INTO events (kind, key, data) VALUES (?, ?, ?)", (kind, key, data)
+        ).lastrowid
+        conn.execute("DELETE FROM events WHERE id <= ?", (event_id - EVENT_REPLAY,))
+        conn.commit()
+        return event_id
+
+    def latest_event_id(self):
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def events_after(self, last_id, limit=EVENT_REPLAY):
+        return self._conn().execute(
+            "SELECT id, kind, key, data FROM events WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)
+        ).fetchall()
+
+    def wait_for_event(self, last_id, timeout):
+        """
+        Returns once another connection has committed (possibly a new event)
+        or `timeout` has passed. Other processes' writes can't wake us, so this
+        checks PRAGMA data_version every EVENT_POLL_SECONDS, which reads no table.
+        Ref: https://www.sqlite.org/pragma.html#pragma_data_version
+        """
+        conn = self._conn()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(min(EVENT_POLL_SECONDS, max(0, deadline - time.time())))
+            if conn.execute("PRAGMA data_version").fetchone()[0] != version:
+                return
+
+STATE_BACKENDS = {"local": LocalState, "sqlite": SQLiteState}
+
+def make_state(backend=STATE_BACKEND):
+    """Builds the configured state backend ("local" or "sqlite")."""
+    if backend not in STATE_BACKENDS:
+        raise ValueError(f"❌ ERROR: Unknown state backend '{backend}', expected one of {list(STATE_BACKENDS)}")
+    print(f"⚙️ Shared state backend: {backend}")
+    return STATE_BACKENDS[backend]()
@@ -0,0 +1,100 @@
+import io
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The model modules import each other by bare name, as they do on the server
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model")
+sys.path.insert(0, MODEL_DIR)
+from engine import extract_products, ingest_system_log, REQUIRED_FEATURES  # noqa: E402
+from catalogue import CveCatalogue  # noqa: E402
+from features import encoder_for  # noqa: E402
+
+VERSIONS = [
+    "Microsoft Windows 10 22H2",
+    "microsoft windows kernel 10.0.19041",  # Matched case-insensitively
+    "MICROSOFT WINDOWS PRINT SPOOLER",
+    "Microsoft Windows DNS Server 2019",
+    "OpenSSL 1.1.1k",
+    "MySQL 8.0",
+    "Nginx 1.18",
+    "Apache Struts 2.5",
+    "Apache HTTP Server 2.4",  # No catalogue product
+    "",
+    None,
+    np.nan,
+    "Microsoft Windows 10 22H2",  # Repeated versions map the same way
+]
+
+# === Fixtures ===
+@pytest.fixture(scope="module")
+def catalogue():
+    return CveCatalogue(os.path.join(MODEL_DIR, "cve_log.csv"))
+
+def reference_products(software_versions, products):
+    # Row-by-row first-match loop the vectorized extraction replaced
+    def extract_product(software_version):
+        for product in products:
+            if isinstance(software_version, str) and product.lower() in software_version.lower():
+                return product
+        return None
+    matched = software_versions.apply(extract_product).astype(object)
+    return matched.where(matched.notna(), None)  # apply() turns some None into NaN
+
+# === extract_products ===
+def test_extract_products_matches_the_row_by_row_loop(catalogue):
+    versions = pd.Series(VERSIONS, dtype=object)
+    for order in (catalogue.match_order(), catalogue.products()):
+        expected = reference_products(versions, order)
+        assert extract_products(versions, order).tolist() == expected.tolist()
+
+def test_extract_products_keeps_the_index():
+    versions = pd.Series(["MySQL 8.0", "Nginx"], index=[10, 20], dtype=object)
+    assert extract_products(versions, ["MySQL"]).to_dict() == {10: "MySQL", 20: None}
+
+def test_first_product_in_the_given_order_wins():
+    versions = pd.Series(["Microsoft Windows Kernel 10"], dtype=object)
+    assert extract_products(versions, ["Microsoft Windows", "Microsoft Windows Kernel"])[0] == "Microsoft Windows"
+    assert extract_products(versions, ["Microsoft Windows Kernel", "Microsoft Windows"])[0] == "Microsoft Windows Kernel"
+
+# === Longest-first match order ===
+def test_match_order_puts_longer_names_first(catalogue):
+    order = catalogue.match_order()
+    assert sorted(order) == sorted(catalogue.products())
+    assert [len(name) for name in order] == sorted((len(name) for name in order), reverse=True)
+
+def test_most_specific_product_wins(catalogue):
+    versions = pd.Series(VERSIONS[:4], dtype=object)
+    assert extract_products(versions, catalogue.match_order()).tolist() == [
+        "Microsoft Windows",
+        "Microsoft Windows Kernel",
+        "Microsoft Windows Print Spooler",
+        "Microsoft Windows DNS Server",
+    ]
+
+# === Chunked ingestion ===
+def test_chunked_ingestion_matches_whole_file(catalogue):
+    rng = np.random.default_rng(0)
+    n = 500
+    log = pd.DataFrame({
+        "System_ID": [f"S{i}" for i in range(n)],
+        "Software_Version": rng.choice(np.array(VERSIONS, dtype=object), n),
+        "Owner": "someone",  # Columns scoring does not need are never parsed
+        "Criticality_Level": rng.choice(["High", "Medium", "Low", None], n),
+        "Network_Access_Level": rng.choice(["Public", "Internal", "Private"], n),
+        "Patch_Level": rng.choice(["Up-to-date", "Outdated"], n),
+    }).to_csv(index=False)
+    encoder = encoder_for(REQUIRED_FEATURES)
+
+    whole = ingest_system_log(io.StringIO(log), catalogue.match_order(), encoder)
+    chunked = ingest_system_log(io.StringIO(log), catalogue.match_order(), encoder, chunk_rows=37)
+
+    expected = reference_products(pd.read_csv(io.StringIO(log))["Software_Version"], catalogue.match_order())
+    assert whole["system_ids"].tolist() == [f"S{i}" for i in np.flatnonzero(expected.notna())]
+    assert whole["products"].tolist() == expected.dropna().tolist()
+    for key in ("system_ids", "products"):
+        assert chunked[key].tolist() == whole[key].tolist()
+    np.testing.assert_array_equal(chunked["rows"][chunked["codes"]], whole["rows"][whole["codes"]])
+    assert chunked["total_rows"] == whole["total_rows"] == n
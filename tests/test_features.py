@@ -0,0 +1,173 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The model modules import each other by bare name, as they do on the server
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model")
+sys.path.insert(0, MODEL_DIR)
+from engine import REQUIRED_FEATURES  # noqa: E402
+from catalogue import CveCatalogue  # noqa: E402
+from features import FeatureEncoder, cross_join_indices, unique_rows  # noqa: E402
+
+PRODUCTS = ["Microsoft Windows", "OpenSSL", "MySQL"]
+
+# === Reference: the pre-encoder preprocessing (merged pairs -> get_dummies) ===
+def preprocess_data(combined_df):
+    # Drop unused legacy columns
+    if 'Base_Risk' in combined_df.columns:
+        combined_df = combined_df.drop(columns=['Base_Risk'])
+
+    # Normalize CVSS score to 0-1 (already done for rows coming from the CVE catalogue)
+    if 'CVSS_Score' in combined_df.columns:
+        if 'Normalized_CVSS' not in combined_df.columns:
+            combined_df['Normalized_CVSS'] = combined_df['CVSS_Score'] / 10
+        combined_df = combined_df.drop(columns=['CVSS_Score'])
+    else:
+        raise KeyError("❌ ERROR: CVSS_Score column is missing!")
+
+    # Normalize historical attack data (0-1 range)
+    # Ref: https://pandas.pydata.org/docs/reference/api/pandas.DataFrame.max.html
+    if 'Historical_Attack_Data' in combined_df.columns:
+        max_val = combined_df['Historical_Attack_Data'].max()
+        if max_val != 0:
+            combined_df['Historical_Attack_Data'] = combined_df['Historical_Attack_Data'] / max_val
+
+    # Convert text-based severity to weight
+    criticality_weights = {'High': 1.0, 'Medium': 0.7, 'Low': 0.4}
+    if 'Criticality_Level' in combined_df.columns:
+        combined_df['Criticality_Weight'] = combined_df['Criticality_Level'].map(criticality_weights)
+
+    # One-hot encode select categorical fields
+    # Ref: https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.get_dummies.html
+    categorical_columns = [
+        'Exploit_Status',
+        'Patch_Availability',
+        'Network_Access_Level',
+        'Patch_Level'
+    ]
+    existing = [col for col in categorical_columns if col in combined_df.columns]
+
+    # Skip fields whose one-hot columns were precomputed by the CVE catalogue
+    precomputed = [
+        col for col in existing
+        if any(name.startswith(f"{col}_") for name in combined_df.columns)
+    ]
+    if precomputed:
+        combined_df = combined_df.drop(columns=precomputed)
+        existing = [col for col in existing if col not in precomputed]
+
+    if existing:
+        combined_df = pd.get_dummies(combined_df, columns=existing, drop_first=True)
+
+    # Drop extra fields not used for model input
+    drop_columns = [
+        'CVE_ID', 'Product', 'Description', 'Severity', 'System_ID',
+        'Component_Name', 'Software_Version', 'Configuration_Details',
+        'Owner', 'Timestamp_x', 'Timestamp_y', 'Criticality_Level'
+    ]
+    combined_df = combined_df.drop(columns=drop_columns, errors='ignore')
+
+    # Check for any non-numeric columns remaining
+    non_numeric = combined_df.select_dtypes(include=['object']).columns
+    if len(non_numeric) > 0:
+        raise ValueError(f"❌ ERROR: Non-numeric columns detected: {non_numeric}")
+
+    return combined_df
+
+# === Fixtures: a few real CVEs and systems covering every category ===
+@pytest.fixture(scope="module")
+def cve_df():
+    frame = pd.read_csv(os.path.join(MODEL_DIR, "cve_log.csv"))
+    frame = frame[frame["Product"].isin(PRODUCTS)].groupby("Product").head(6)
+    # Both values of each CVE-side category must appear for get_dummies(drop_first=True)
+    assert set(frame["Exploit_Status"]) == {"Yes", "No"}
+    assert set(frame["Patch_Availability"]) == {"Available", "Not Available"}
+    return frame.reset_index(drop=True)
+
+@pytest.fixture(scope="module")
+def system_df():
+    levels = ["High", "Medium", "Low", "High", "Low", "Medium"]
+    access = ["Public", "Internal", "Private", "Internal", "Public", "Private"]
+    patches = ["Up-to-date", "Outdated", "Outdated", "Up-to-date", "Outdated", "Up-to-date"]
+    rows = [
+        {
+            "System_ID": f"SYS-{p}{k}", "Component_Name": "comp", "Software_Version": f"{product} x",
+            "Configuration_Details": "cfg", "Owner": "own", "Criticality_Level": levels[k],
+            "Network_Access_Level": access[k], "Patch_Level": patches[k], "Timestamp": "x", "Product": product,
+        }
+        for p, product in enumerate(PRODUCTS) for k in range(len(levels))
+    ]
+    return pd.DataFrame(rows)
+
+def merged_pairs(cve_df, system_df):
+    """The old pipeline's merge, plus each pair's row positions on both sides."""
+    merged = pd.merge(
+        cve_df.assign(cve_pos=np.arange(len(cve_df))),
+        system_df.assign(system_pos=np.arange(len(system_df))),
+        on="Product", how="inner",
+    )
+    return merged.drop(columns=["cve_pos", "system_pos"]), merged["cve_pos"].to_numpy(), merged["system_pos"].to_numpy()
+
+def encoded_pairs(encoder, cve_df, system_df, cve_idx, system_idx, attack_data_max):
+    cve_block = encoder.encode_cves(cve_df, attack_data_max)
+    system_block = encoder.encode_systems(system_df)
+    return encoder.assemble(cve_block, system_block, cve_idx, system_idx, encoder.allocate(len(cve_idx)))
+
+# === Parity with preprocess_data + get_dummies ===
+def test_matches_preprocess_data(cve_df, system_df):
+    merged, cve_idx, system_idx = merged_pairs(cve_df, system_df)
+    expected = preprocess_data(merged.copy())[REQUIRED_FEATURES].astype(np.float64).to_numpy()
+
+    encoder = FeatureEncoder(REQUIRED_FEATURES)
+    matrix = encoded_pairs(encoder, cve_df, system_df, cve_idx, system_idx, merged["Historical_Attack_Data"].max())
+    np.testing.assert_array_equal(matrix, expected)
+
+def test_matches_preprocess_data_from_catalogue_rows(cve_df, system_df):
+    # Catalogue rows carry precomputed Normalized_CVSS and CVE one-hot columns
+    catalogue = CveCatalogue(os.path.join(MODEL_DIR, "cve_log.csv"))
+    rows = catalogue.rows_for(PRODUCTS)
+    rows = rows[rows["CVE_ID"].isin(set(cve_df["CVE_ID"]))].reset_index(drop=True)
+    merged, cve_idx, system_idx = merged_pairs(rows, system_df)
+    expected = preprocess_data(merged.copy())[REQUIRED_FEATURES].astype(np.float64).to_numpy()
+
+    encoder = FeatureEncoder(REQUIRED_FEATURES)
+    matrix = encoded_pairs(encoder, rows, system_df, cve_idx, system_idx, merged["Historical_Attack_Data"].max())
+    np.testing.assert_array_equal(matrix, expected)
+
+def test_follows_the_model_feature_order(cve_df, system_df):
+    merged, cve_idx, system_idx = merged_pairs(cve_df, system_df)
+    shuffled = list(np.random.default_rng(0).permutation(REQUIRED_FEATURES))
+    expected = preprocess_data(merged.copy())[shuffled].astype(np.float64).to_numpy()
+
+    encoder = FeatureEncoder(shuffled)
+    matrix = encoded_pairs(encoder, cve_df, system_df, cve_idx, system_idx, merged["Historical_Attack_Data"].max())
+    np.testing.assert_array_equal(matrix, expected)
+
+def test_pair_order_matches_merge(cve_df, system_df):
+    # Per product, cross_join_indices walks pairs in the order pd.merge produced them
+    product = PRODUCTS[0]
+    cves = np.flatnonzero(cve_df["Product"] == product)
+    systems = np.flatnonzero(system_df["Product"] == product)
+    _, cve_idx, system_idx = merged_pairs(cve_df.iloc[cves], system_df.iloc[systems])
+    joined_cves, joined_systems = cross_join_indices(np.arange(len(cves)), np.arange(len(systems)))
+    np.testing.assert_array_equal(joined_cves, cve_idx)
+    np.testing.assert_array_equal(joined_systems, system_idx)
+
+# === Fixed schema ===
+def test_missing_category_still_gets_its_column(system_df):
+    # get_dummies would drop Network_Access_Level_Public here; the encoder keeps it, all zeros
+    internal = system_df[system_df["Network_Access_Level"] == "Internal"]
+    encoder = FeatureEncoder(REQUIRED_FEATURES)
+    block = encoder.encode_systems(internal)
+    column = [column for column, _ in encoder.system_specs].index("Network_Access_Level")
+    assert block.shape == (len(internal), len(encoder.system_specs))
+    assert not block[:, column].any()
+
+def test_unknown_criticality_rows_group_together(system_df):
+    systems = system_df.assign(Criticality_Level=["Unknown", None] * (len(system_df) // 2))
+    block = FeatureEncoder(REQUIRED_FEATURES).encode_systems(systems)
+    codes, rows = unique_rows(block)
+    assert np.isnan(rows[:, 0]).all()  # Criticality_Weight, like Series.map on an unknown level
+    assert len(rows) == len(np.unique(block[:, 1:], axis=0))
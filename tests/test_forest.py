@@ -0,0 +1,86 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sklearn_ensemble = pytest.importorskip("sklearn.ensemble")
+
+# The model modules import each other by bare name, as they do on the server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model"))
+from forest import CompiledForest, compile_forest, check_parity  # noqa: E402
+
+FEATURES = ["Historical_Attack_Data", "Criticality_Weight", "Normalized_CVSS", "Exploit_Status_Yes"]
+
+# === Fixtures: small fitted forests ===
+def fit_forest(X, y, **params):
+    model = sklearn_ensemble.RandomForestRegressor(n_estimators=8, max_depth=5, random_state=0, **params)
+    return model.fit(pd.DataFrame(X, columns=FEATURES), y)
+
+@pytest.fixture(scope="module")
+def forest():
+    rng = np.random.default_rng(0)
+    X = rng.random((400, len(FEATURES)))
+    X[:, 3] = rng.integers(0, 2, len(X))  # One-hot style 0/1 column
+    return fit_forest(X, X[:, 0] * 0.6 + X[:, 2] * 0.4 + rng.normal(0, 0.05, len(X)))
+
+def split_thresholds(compiled, feature):
+    internal = compiled.left != np.arange(len(compiled.left))
+    return np.unique(compiled.threshold[internal & (compiled.feature == feature)])
+
+def assert_same_predictions(model, compiled, X):
+    frame = pd.DataFrame(X, columns=FEATURES)
+    np.testing.assert_allclose(compiled.predict(X), model.predict(frame), rtol=0, atol=1e-12)
+
+# === Parity with sklearn ===
+def test_matches_sklearn_on_random_rows(forest):
+    compiled = CompiledForest.from_sklearn(forest)
+    X = np.random.default_rng(1).random((1000, len(FEATURES)))
+    assert_same_predictions(forest, compiled, X)
+
+def test_matches_sklearn_exactly_on_thresholds(forest):
+    # Rows sitting on a split value must go left (x <= threshold), as in sklearn
+    compiled = CompiledForest.from_sklearn(forest)
+    rng = np.random.default_rng(2)
+    for j in range(len(FEATURES)):
+        cuts = split_thresholds(compiled, j)
+        X = rng.random((len(cuts), len(FEATURES)))
+        X[:, j] = cuts
+        assert_same_predictions(forest, compiled, X)
+        # Just either side of the float32-rounded cut as well
+        X[:, j] = np.nextafter(cuts.astype(np.float32), np.float32(np.inf))
+        assert_same_predictions(forest, compiled, X)
+
+def test_matches_sklearn_on_nan_inputs():
+    rng = np.random.default_rng(3)
+    X = rng.random((400, len(FEATURES)))
+    y = X[:, 0] + X[:, 1]
+    X[rng.random(X.shape) < 0.2] = np.nan  # Trees learn a missing-value direction per split
+    model = fit_forest(X, y)
+    compiled = CompiledForest.from_sklearn(model)
+
+    probe = rng.random((300, len(FEATURES)))
+    probe[rng.random(probe.shape) < 0.3] = np.nan
+    probe[:5] = np.nan  # Rows with every feature missing
+    assert_same_predictions(model, compiled, probe)
+
+def test_predict_chunks_do_not_change_results(forest):
+    compiled = CompiledForest.from_sklearn(forest)
+    X = np.random.default_rng(4).random((1000, len(FEATURES)))
+    np.testing.assert_array_equal(compiled.predict(X, chunk_size=7), compiled.predict(X))
+
+# === compile_forest ===
+def test_compile_forest_is_cached_per_model(forest):
+    compiled = compile_forest(forest)
+    assert compiled is compile_forest(forest)
+    assert list(compiled.feature_names_in_) == FEATURES
+
+def test_check_parity_rejects_a_different_forest(forest):
+    other = fit_forest(np.random.default_rng(5).random((100, len(FEATURES))), np.zeros(100) + 0.5)
+    X = pd.DataFrame(np.random.default_rng(6).random((50, len(FEATURES))), columns=FEATURES)
+    with pytest.raises(ValueError):
+        check_parity(forest, CompiledForest.from_sklearn(other), X)
+
+def test_rejects_unfitted_models():
+    with pytest.raises(TypeError):
+        CompiledForest.from_sklearn(sklearn_ensemble.RandomForestRegressor())
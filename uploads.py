@@ -0,0 +1,142 @@
+import io
+import os
+from datetime import datetime
+from werkzeug.utils import secure_filename
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Field, File, Data, Epilogue
+
+# === Streaming Upload Configuration ===
+STREAM_READ_BYTES = 256 * 1024  # Bytes pulled from the socket per read
+UPLOAD_TEE = os.getenv("DAIVERP_UPLOAD_TEE", "0") == "1"  # Also keep a copy of streamed uploads on disk
+MAX_FIELD_BYTES = 64 * 1024  # Plain form fields (e.g. "model") are tiny
+MAX_PARTS = 16
+
+# === Streaming Multipart File Reader ===
+class MultipartFileStream(io.RawIOBase):
+    """
+    Readable binary stream over the first file part of a multipart/form-data
+    request body.
+
+    Bytes are pulled from `stream` (the WSGI input) only when the reader asks
+    for more, and decoded with werkzeug's sans-IO MultipartDecoder, so the
+    CSV parser consumes the upload while it is still arriving instead of
+    after werkzeug has spooled it to a temp file. When `tee_dir` is given the
+    file bytes are also written there as they pass through, named like
+    /upload names saved files; the path is kept in `tee_path`.
+
+    Form fields sent before the file are available in `fields` once open()
+    returns; fields sent after it are collected by close(). Rejected uploads
+    are dropped with discard(), which also removes the tee copy.
+    Ref: https://werkzeug.palletsprojects.com/en/stable/datastructures/#werkzeug.sansio.multipart.MultipartDecoder
+    """
+
+    def __init__(self, stream, boundary, tee_dir=None, read_size=STREAM_READ_BYTES):
+        super().__init__()
+        self.stream = stream
+        self.read_size = read_size
+        self.decoder = MultipartDecoder(boundary.encode("latin-1"), max_parts=MAX_PARTS)
+        self.fields = {}
+        self.filename = None
+        self.bytes_received = 0
+        self.tee_dir = tee_dir
+        self.tee_path = None
+        self._tee = None
+        self._pending = bytearray()
+        self._part = None  # ("field", name) or ("file", name) for the part being decoded
+        self._field_data = bytearray()
+        self._file_done = False
+        self._body_done = False
+        self._eof = False
+
+    def _pump(self):
+        """Handles one decoder event, reading from the socket when it needs data."""
+        event = self.decoder.next_event()
+        if isinstance(event, NeedData):
+            if self._eof:
+                raise ValueError("❌ ERROR: Upload ended before the multipart body was complete")
+            chunk = self.stream.read(self.read_size)
+            self.bytes_received += len(chunk)
+            self._eof = not chunk
+            self.decoder.receive_data(chunk or None)  # None tells the decoder the body has ended
+        elif isinstance(event, Field):
+            self._part = ("field", event.name)
+            self._field_data = bytearray()
+        elif isinstance(event, File):
+            if self.filename is None:
+                self._part = ("file", event.name)
+                self.filename = event.filename
+                if self.tee_dir:
+                    name = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{secure_filename(event.filename or 'upload.csv')}"
+                    self.tee_path = os.path.join(self.tee_dir, name)
+                    self._tee = open(self.tee_path, "wb")
+            else:
+                self._part = ("ignored", event.name)  # Only the first file is read
+        elif isinstance(event, Data):
+            kind = self._part[0] if self._part else None
+            if kind == "field":
+                self._field_data.extend(event.data)
+                if len(self._field_data) > MAX_FIELD_BYTES:
+                    raise ValueError(f"❌ ERROR: Form field '{self._part[1]}' is too large")
+                if not event.more_data:
+                    self.fields[self._part[1]] = self._field_data.decode("utf-8", "replace")
+            elif kind == "file" and not self._file_done:
+                self._pending.extend(event.data)
+                if self._tee:
+                    self._tee.write(event.data)
+                if not event.more_data:
+                    self._file_done = True
+        elif isinstance(event, Epilogue):
+            self._body_done = True
+            self._file_done = True
+
+    def open(self):
+        """
+        Reads up to the start of the file part and returns its filename
+        (None if the body has no file).
+        """
+        while self.filename is None and not self._body_done:
+            self._pump()
+        return self.filename
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._file_done:
+            self._pump()
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        del self._pending[:size]
+        return size
+
+    def close(self):
+        if not self.closed:
+            try:
+                # Drain the rest of the body so trailing form fields are parsed
+                while not self._body_done:
+                    self._pump()
+            finally:
+                if self._tee:
+                    self._tee.close()
+        super().close()
+
+    def discard(self):
+        """
+        Closes without reading the rest of the body and deletes the tee copy,
+        for uploads that are rejected.
+        """
+        if self._tee:
+            self._tee.close()
+        if self.tee_path and os.path.exists(self.tee_path):
+            os.remove(self.tee_path)
+        super().close()
+
+def open_upload_stream(request, tee_dir=None):
+    """
+    Wraps a multipart/form-data Flask request in a buffered MultipartFileStream.
+    Returns (buffered_reader, raw_stream).
+    """
+    boundary = request.mimetype_params.get("boundary")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        raise ValueError("❌ ERROR: Expected a multipart/form-data upload")
+    raw = MultipartFileStream(request.stream, boundary, tee_dir)
+    return io.BufferedReader(raw, buffer_size=STREAM_READ_BYTES), raw